@@ -1,26 +1,110 @@
 from time import sleep
 
+MEASUREMENT_TIME = 0.08
+STATUS_BUSY = 0x80
+
+def crc8(data):
+    # CRC-8, polynomial 0x31, initial value 0xFF (AHT2x/AHT30 datasheet)
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ 0x31) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+    return crc
+
 class AHT30:
     def __init__(self, i2c, address=0x38):
         self.i2c = i2c
         self.address = address
+        self.pending = False
         self.i2c.writeto(self.address, b"\xBE\x08\x00")
         sleep(0.02)
 
+    def start_measurement(self):
+        """
+        Trigger a conversion and return immediately.
+        """
+        self.i2c.writeto(self.address, b"\xAC\x33\x00")
+        self.pending = True
+
+    def read_ready(self):
+        """
+        True once the busy bit of the status byte has cleared.
+        """
+        status = self.i2c.readfrom(self.address, 1)
+        return not (status[0] & STATUS_BUSY)
+
+    def poll(self):
+        """
+        Collect a triggered measurement without waiting.
+        Returns None while the sensor is still busy, otherwise
+        (temperature_c, humidity_percent) or (None, None) on failure.
+        Raises RuntimeError if start_measurement() was not called.
+        """
+        if not self.pending:
+            raise RuntimeError("no measurement pending; call start_measurement()")
+        try:
+            data = self.i2c.readfrom(self.address, 7)
+        except Exception:
+            self.pending = False
+            return None, None
+
+        if len(data) == 7 and data[0] & STATUS_BUSY:
+            return None
+
+        self.pending = False
+        return self._decode(data)
+
+    @staticmethod
+    def _decode(data):
+        if len(data) != 7 or crc8(data[:6]) != data[6]:
+            return None, None
+
+        raw_h = (data[1] << 12) | (data[2] << 4) | (data[3] >> 4)
+        raw_t = ((data[3] & 0x0F) << 16) | (data[4] << 8) | data[5]
+
+        humidity = (raw_h / 1048576) * 100
+        temperature = (raw_t / 1048576) * 200 - 50
+        return round(temperature, 2), round(humidity, 2)
+
     def read(self):
         try:
-            self.i2c.writeto(self.address, b"\xAC\x33\x00")
-            sleep(0.08)
-            data = self.i2c.readfrom(self.address, 6)
-            if len(data) != 6:
-                return None, None
+            self.start_measurement()
+            sleep(MEASUREMENT_TIME)
+            for _ in range(10):
+                result = self.poll()
+                if result is not None:
+                    return result
+                sleep(0.01)
+            self.pending = False
+            return None, None
 
-            raw_h = (data[1] << 12) | (data[2] << 4) | (data[3] >> 4)
-            raw_t = ((data[3] & 0x0F) << 16) | (data[4] << 8) | data[5]
+        except Exception:
+            self.pending = False
+            return None, None
 
-            humidity = (raw_h / 1048576) * 100
-            temperature = (raw_t / 1048576) * 200 - 50
-            return round(temperature, 2), round(humidity, 2)
+    async def read_async(self):
+        """
+        Non-blocking read() for asyncio/uasyncio tasks.
+        """
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio  # type: ignore
 
+        try:
+            self.start_measurement()
         except Exception:
             return None, None
+
+        await asyncio.sleep(MEASUREMENT_TIME)
+        for _ in range(10):
+            result = self.poll()
+            if result is not None:
+                return result
+            await asyncio.sleep(0.01)
+        self.pending = False
+        return None, None
@@ -0,0 +1,559 @@
+"""
+archive.py
+Columnar archive for JSONL captures (host side)
+
+Layout (little-endian):
+
+    file   = b"WXCA" u16 version u16 pad, then chunks
+    chunk  = b"CHNK" u32 meta_len u64 data_len, meta JSON, data
+    column = one slice of the chunk data, 8-byte aligned
+
+Each chunk holds up to `chunk_rows` records flattened into dotted
+column names ("local.light_lux"). A column is stored as one of:
+
+    const   the same value in every row (no data)
+    int     int32/int64 array
+    delta   int array of differences, `base` is the first value
+    float   float64 (or float32) array, NaN for null
+    dict    dictionary of JSON values plus u8/u16/u32 codes
+
+Bitmaps (one bit per row, LSB first) carry what the arrays cannot:
+
+    present   rows that have the key at all; rows() leaves the others
+              out instead of returning an explicit null
+    nulls     null rows of an int column (stored as 0)
+    ints      float-column rows that held an int, so 41 reads back as 41
+
+Chunks are independent, so appending only writes new chunks at the
+end. Archive memory-maps the file and returns numeric columns as
+memoryviews over the map, without copying.
+
+    python archive.py convert esp32_weather.jsonl esp32_weather.wxa
+    python archive.py info esp32_weather.wxa
+"""
+
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b"WXCA"
+VERSION = 1
+CHUNK_MAGIC = b"CHNK"
+
+_FILE_HEADER = struct.Struct("<4sH2x")
+_CHUNK_HEADER = struct.Struct("<4sIQ")
+
+KIND_CONST = "const"
+KIND_INT = "int"
+KIND_DELTA = "delta"
+KIND_FLOAT = "float"
+KIND_DICT = "dict"
+
+_INT32_MIN = -(1 << 31)
+_INT32_MAX = (1 << 31) - 1
+
+
+def flatten(record, prefix="", out=None):
+    if out is None:
+        out = {}
+    for key, value in record.items():
+        name = prefix + key
+        if isinstance(value, dict) and value:
+            flatten(value, name + ".", out)
+        else:
+            out[name] = value
+    return out
+
+
+def unflatten(flat):
+    """
+    Inverse of flatten(). A null at "api" next to "api.city" (one
+    record had no api block, another did) loses to the nested keys.
+    """
+    record = {}
+    for name, value in flat.items():
+        node = record
+        parts = name.split(".")
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = node[part] = {}
+            node = child
+        if value is None and isinstance(node.get(parts[-1]), dict):
+            continue
+        node[parts[-1]] = value
+    return record
+
+
+def _pad(n):
+    return (-n) % 8
+
+
+def _is_number(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _int_typecode(values):
+    lo = min(values)
+    hi = max(values)
+    return "i" if _INT32_MIN <= lo and hi <= _INT32_MAX else "q"
+
+
+def _typed_bytes(typecode, values):
+    data = array(typecode, values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _bitmap(flags):
+    flags = list(flags)
+    bits = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            bits[i >> 3] |= 1 << (i & 7)
+    return bytes(bits)
+
+
+def _bit(bits, i):
+    return bits[i >> 3] & (1 << (i & 7))
+
+
+def _is_int(v):
+    return isinstance(v, int) and not isinstance(v, bool)
+
+
+# Largest int each float type holds exactly
+_FLOAT_EXACT = {"d": 1 << 53, "f": 1 << 24}
+
+
+def _encode_column(name, values, float_type, delta_columns):
+    """
+    Pick the cheapest encoding for one column of a chunk.
+    Returns (descriptor, data bytes, {bitmap name: bytes}).
+    """
+    first = values[0]
+    if all(v == first and type(v) is type(first) for v in values):
+        return {"name": name, "kind": KIND_CONST, "value": first}, b"", {}
+
+    if all(v is None or _is_number(v) for v in values):
+        if all(v is None or _is_int(v) for v in values):
+            if None in values:
+                ints = [0 if v is None else v for v in values]
+                typecode = _int_typecode(ints)
+                desc = {"name": name, "kind": KIND_INT, "type": typecode}
+                nulls = _bitmap(v is None for v in values)
+                return desc, _typed_bytes(typecode, ints), {"nulls": nulls}
+            if name in delta_columns:
+                deltas = [b - a for a, b in zip(values, values[1:])]
+                typecode = _int_typecode(deltas)
+                desc = {"name": name, "kind": KIND_DELTA,
+                        "type": typecode, "base": values[0]}
+                return desc, _typed_bytes(typecode, deltas), {}
+            typecode = _int_typecode(values)
+            desc = {"name": name, "kind": KIND_INT, "type": typecode}
+            return desc, _typed_bytes(typecode, values), {}
+
+        limit = _FLOAT_EXACT[float_type]
+        if all(not _is_int(v) or -limit <= v <= limit for v in values):
+            floats = [math.nan if v is None else float(v) for v in values]
+            desc = {"name": name, "kind": KIND_FLOAT, "type": float_type}
+            bitmaps = {}
+            if any(_is_int(v) for v in values):
+                bitmaps["ints"] = _bitmap(_is_int(v) for v in values)
+            return desc, _typed_bytes(float_type, floats), bitmaps
+
+    dictionary = []
+    index = {}
+    codes = []
+    for v in values:
+        key = json.dumps(v, separators=(",", ":"), sort_keys=True)
+        code = index.get(key)
+        if code is None:
+            code = index[key] = len(dictionary)
+            dictionary.append(v)
+        codes.append(code)
+
+    if len(dictionary) <= 0x100:
+        typecode = "B"
+    elif len(dictionary) <= 0x10000:
+        typecode = "H"
+    else:
+        typecode = "I"
+    desc = {"name": name, "kind": KIND_DICT, "type": typecode,
+            "dict": dictionary}
+    return desc, _typed_bytes(typecode, codes), {}
+
+
+class ArchiveWriter:
+    """
+    Appends records to an archive, one chunk per `chunk_rows` records.
+    """
+
+    def __init__(self, path, append=False, chunk_rows=65536,
+                 float_type="d", delta_columns=("timestamp",)):
+        if float_type not in ("d", "f"):
+            raise ValueError("float_type must be 'd' or 'f'")
+        self.chunk_rows = chunk_rows
+        self.float_type = float_type
+        self.delta_columns = set(delta_columns)
+        self.rows_written = 0
+
+        exists = append and os.path.exists(path) and os.path.getsize(path)
+        if exists:
+            with open(path, "rb") as f:
+                _check_header(f.read(_FILE_HEADER.size))
+            self._file = open(path, "ab")
+        else:
+            self._file = open(path, "wb")
+            self._file.write(_FILE_HEADER.pack(MAGIC, VERSION))
+
+        self._rows = []
+
+    def write(self, record):
+        self._rows.append(flatten(record))
+        if len(self._rows) >= self.chunk_rows:
+            self.flush_chunk()
+
+    def flush_chunk(self):
+        rows = self._rows
+        if not rows:
+            return
+        self._rows = []
+
+        names = {}
+        for row in rows:
+            for name in row:
+                names[name] = None
+
+        columns = []
+        blobs = []
+        offset = 0
+
+        def add_blob(data):
+            nonlocal offset
+            start = offset
+            if data:
+                blobs.append(data)
+                blobs.append(b"\0" * _pad(len(data)))
+                offset += len(data) + _pad(len(data))
+            return start
+
+        for name in names:
+            values = [row.get(name) for row in rows]
+            desc, data, bitmaps = _encode_column(
+                name, values, self.float_type, self.delta_columns
+            )
+            desc["offset"] = add_blob(data)
+            desc["length"] = len(data)
+            if any(name not in row for row in rows):
+                bitmaps["present"] = _bitmap(name in row for row in rows)
+            for key, bits in bitmaps.items():
+                desc[key] = [add_blob(bits), len(bits)]
+            columns.append(desc)
+
+        meta = json.dumps(
+            {"rows": len(rows), "columns": columns},
+            separators=(",", ":")
+        ).encode()
+        meta += b" " * _pad(len(meta))
+
+        self._file.write(_CHUNK_HEADER.pack(CHUNK_MAGIC, len(meta), offset))
+        self._file.write(meta)
+        for blob in blobs:
+            self._file.write(blob)
+        self.rows_written += len(rows)
+
+    def close(self):
+        self.flush_chunk()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _check_header(header):
+    if len(header) < _FILE_HEADER.size:
+        raise ValueError("not an archive: file too short")
+    magic, version = _FILE_HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError("not an archive: bad magic")
+    if version != VERSION:
+        raise ValueError("unsupported archive version: %d" % version)
+
+
+class ConstColumn:
+    def __init__(self, value, length):
+        self.value = value
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if not -self._length <= index < self._length:
+            raise IndexError("column index out of range")
+        return self.value
+
+    def __iter__(self):
+        for _ in range(self._length):
+            yield self.value
+
+
+class DictColumn:
+    """
+    Dictionary-encoded column; `codes` is a view over the mapped file.
+    """
+
+    def __init__(self, codes, dictionary):
+        self.codes = codes
+        self.dictionary = dictionary
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.dictionary[self.codes[index]]
+
+    def __iter__(self):
+        dictionary = self.dictionary
+        for code in self.codes:
+            yield dictionary[code]
+
+
+class Chunk:
+    def __init__(self, view, meta):
+        self.rows = meta["rows"]
+        self.columns = {c["name"]: c for c in meta["columns"]}
+        self._view = view
+
+    def release(self):
+        self._view.release()
+
+    def bitmap(self, name, key):
+        """
+        The column's `key` bitmap ("present", "nulls", "ints"), or None
+        when it has none.
+        """
+        desc = self.columns.get(name)
+        if desc is None or key not in desc:
+            return None
+        offset, length = desc[key]
+        return self._view[offset:offset + length]
+
+    def present(self, name):
+        """
+        The column's presence bitmap, or None when every row has it.
+        """
+        return self.bitmap(name, "present")
+
+    def column(self, name):
+        desc = self.columns.get(name)
+        if desc is None:
+            return ConstColumn(None, self.rows)
+
+        kind = desc["kind"]
+        if kind == KIND_CONST:
+            return ConstColumn(desc["value"], self.rows)
+
+        raw = self._view[desc["offset"]:desc["offset"] + desc["length"]]
+        if sys.byteorder != "little":
+            data = array(desc["type"], raw.tobytes())
+            data.byteswap()
+            raw = memoryview(data)
+        else:
+            raw = raw.cast(desc["type"])
+
+        if kind == KIND_INT and "nulls" in desc:
+            # Nulls have to be put back, so this one is materialised
+            nulls = self.bitmap(name, "nulls")
+            return [None if _bit(nulls, i) else v for i, v in enumerate(raw)]
+        if kind in (KIND_INT, KIND_FLOAT):
+            return raw
+        if kind == KIND_DICT:
+            return DictColumn(raw, desc["dict"])
+
+        # Delta: the only kind that has to be materialised
+        values = array("q", [desc["base"]])
+        total = desc["base"]
+        for d in raw:
+            total += d
+            values.append(total)
+        return values
+
+
+class Archive:
+    """
+    Read-only, memory-mapped view of an archive file.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        _check_header(self._file.read(_FILE_HEADER.size))
+
+        self.chunks = []
+        if size == _FILE_HEADER.size:
+            self._map = None
+            return
+
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = view = memoryview(self._map)
+        pos = _FILE_HEADER.size
+        while pos < size:
+            magic, meta_len, data_len = _CHUNK_HEADER.unpack_from(self._map, pos)
+            if magic != CHUNK_MAGIC:
+                raise ValueError("corrupt archive at offset %d" % pos)
+            pos += _CHUNK_HEADER.size
+            meta = json.loads(bytes(view[pos:pos + meta_len]))
+            pos += meta_len
+            self.chunks.append(Chunk(view[pos:pos + data_len], meta))
+            pos += data_len
+
+    def __len__(self):
+        return sum(chunk.rows for chunk in self.chunks)
+
+    def column_names(self):
+        names = {}
+        for chunk in self.chunks:
+            for name in chunk.columns:
+                names[name] = None
+        return list(names)
+
+    def iter_column(self, name):
+        """
+        Yield the column one chunk at a time (zero-copy where possible).
+        """
+        for chunk in self.chunks:
+            yield chunk.column(name)
+
+    def column(self, name):
+        """
+        Return the whole column as one flat list.
+        """
+        values = []
+        for part in self.iter_column(name):
+            values.extend(part)
+        return values
+
+    def rows(self):
+        """
+        Rebuild the original nested records. Nulls come back as None;
+        keys a record did not have are left out.
+        """
+        for chunk in self.chunks:
+            names = list(chunk.columns)
+            columns = [chunk.column(name) for name in names]
+            presence = [chunk.present(name) for name in names]
+            ints = [chunk.bitmap(name, "ints") for name in names]
+            for i in range(chunk.rows):
+                flat = {}
+                for name, col, bits, int_bits in zip(names, columns, presence, ints):
+                    if bits is not None and not _bit(bits, i):
+                        continue
+                    v = col[i]
+                    if isinstance(v, float):
+                        if v != v:
+                            v = None
+                        elif int_bits is not None and _bit(int_bits, i):
+                            v = int(v)
+                    flat[name] = v
+                yield unflatten(flat)
+
+    def close(self):
+        for chunk in self.chunks:
+            chunk.release()
+        self.chunks = []
+        if self._map is not None:
+            self._view.release()
+            try:
+                self._map.close()
+            except BufferError:
+                # Column views still held by the caller keep the map
+                # alive; it is unmapped when the last one goes away
+                pass
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert(src, dst, append=False, chunk_rows=65536, float_type="d"):
+    """
+    Convert a JSONL capture into an archive. Lines that are not JSON
+    objects (boot banners, partial lines) are skipped.
+    Returns (records written, lines skipped).
+    """
+    skipped = 0
+    with ArchiveWriter(dst, append=append, chunk_rows=chunk_rows,
+                       float_type=float_type) as writer, open(src) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(record, dict):
+                skipped += 1
+                continue
+            writer.write(record)
+    return writer.rows_written, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert", help="convert a JSONL capture")
+    p.add_argument("src")
+    p.add_argument("dst")
+    p.add_argument("--append", action="store_true")
+    p.add_argument("--chunk-rows", type=int, default=65536)
+    p.add_argument("--float32", action="store_true",
+                   help="store floats as float32")
+
+    p = sub.add_parser("info", help="describe an archive")
+    p.add_argument("path")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        written, skipped = convert(
+            args.src, args.dst, append=args.append,
+            chunk_rows=args.chunk_rows,
+            float_type="f" if args.float32 else "d"
+        )
+        print("wrote %d records (%d lines skipped) to %s"
+              % (written, skipped, args.dst))
+        return 0
+
+    with Archive(args.path) as archive:
+        print("%s: %d records in %d chunks, %d bytes"
+              % (args.path, len(archive), len(archive.chunks),
+                 os.path.getsize(args.path)))
+        kinds = {}
+        for chunk in archive.chunks:
+            for name, desc in chunk.columns.items():
+                kinds.setdefault(name, set()).add(desc["kind"])
+        for name in archive.column_names():
+            print("  %-28s %s" % (name, "/".join(sorted(kinds[name]))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,491 @@
+"""
+benchmark.py
+Benchmarks for the statistics, trend and payload code paths
+
+Times each statistics.py function across window sizes, the trend
+classifier, json.dumps of a payload and one full sampling iteration
+fed from a JSONL capture. Results are saved as JSON; `compare` (or
+`run --baseline`) exits non-zero when a case got slower than the
+threshold.
+
+    python benchmark.py run --out bench.json
+    python benchmark.py run --baseline bench.json --threshold 0.15
+    python benchmark.py run --runner "micropython -c {code}" --quick
+    python benchmark.py compare old.json new.json
+
+The case code also runs on MicroPython: a command runner starts the
+interpreter with `{code}` replaced by a snippet that imports this module
+and calls worker(), which prints one `BENCH {...}` line per case.
+"""
+
+import json
+import sys
+import time
+
+RESULTS_VERSION = 1
+WINDOWS = (60, 600, 3600, 36000, 100000)
+QUICK_WINDOWS = (60, 3600)
+DEFAULT_CAPTURE = "esp32_weather.jsonl"
+DEFAULT_THRESHOLD = 0.10
+LINE_PREFIX = "BENCH "
+
+STATS_FUNCTIONS = (
+    "mean", "moving_average", "median", "min_max_range",
+    "variance", "std_dev", "correlation"
+)
+
+
+if hasattr(time, "ticks_us"):
+    def _now_us():
+        return time.ticks_us()
+
+    def _elapsed_us(start):
+        return time.ticks_diff(time.ticks_us(), start)
+else:
+    def _now_us():
+        return time.perf_counter()
+
+    def _elapsed_us(start):
+        return (time.perf_counter() - start) * 1e6
+
+
+def _series(n, seed=1):
+    """
+    Deterministic lux-like values (LCG noise on a slow ramp), identical
+    on every interpreter so results stay comparable.
+    """
+    out = []
+    state = seed
+    for i in range(n):
+        state = (state * 1103515245 + 12345) & 0x7FFFFFFF
+        out.append(200.0 + (i % 1000) * 0.1 + (state % 1000) / 100.0)
+    return out
+
+
+# -----------------------------
+# Cases
+# -----------------------------
+# Each case maps a name to a setup function returning the zero-argument
+# callable to time, so setup cost never shows up in the measurement.
+
+def _stats_case(name, window):
+    def setup():
+        import statistics
+        fn = getattr(statistics, name)
+        data = _series(window)
+        if name == "correlation":
+            other = _series(window, seed=7)
+            return lambda: fn(data, other)
+        if name == "moving_average":
+            return lambda: fn(data, 10)
+        return lambda: fn(data)
+    return setup
+
+
+def _rolling_case(window):
+    def setup():
+        from statistics import RollingStats
+        stats = RollingStats(window)
+        data = _series(window + 1024)
+        for x in data[:window]:
+            stats.push(x)
+        feed = data[window:]
+        pos = [0]
+
+        def step():
+            stats.push(feed[pos[0] & 1023])
+            pos[0] += 1
+            return stats.as_dict("lux")
+        return step
+    return setup
+
+
+def _trend_case(window):
+    def setup():
+        from day_night import time_of_day_from_trend
+        from ring_buffer import RingBuffer
+        history = RingBuffer(window, "d")
+        for x in _series(window):
+            history.append(x)
+        return lambda: time_of_day_from_trend(history)
+    return setup
+
+
+def _classifier_case(window):
+    def setup():
+        from day_night import TrendClassifier
+        trend = TrendClassifier(window)
+        data = _series(window + 1024)
+        for x in data[:window]:
+            trend.update(x)
+        feed = data[window:]
+        pos = [0]
+
+        def step():
+            trend.update(feed[pos[0] & 1023])
+            pos[0] += 1
+        return step
+    return setup
+
+
+def _load_records(capture, limit=2048):
+    records = []
+    try:
+        f = open(capture)
+    except OSError:
+        return records
+    with f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith("{"):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and (record.get("local") or {}).get("light_lux") is not None:
+                records.append(record)
+                if len(records) >= limit:
+                    break
+    return records
+
+
+class _ReplaySensors:
+    """
+    Stands in for both AHT30 and LightSensor, replaying capture values.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.pos = 0
+        self.local = records[0]["local"]
+
+    def advance(self):
+        self.local = self.records[self.pos % len(self.records)]["local"]
+        self.pos += 1
+
+    async def read_async(self):
+        return self.local.get("temperature_c"), self.local.get("humidity_percent")
+
+    def read_lux(self):
+        return self.local["light_lux"]
+
+
+def _run_coroutine(coro):
+    # The replay sensors never suspend, so no event loop is needed
+    try:
+        coro.send(None)
+    except StopIteration:
+        pass
+
+
+def _payload_case(capture):
+    def setup():
+        records = _load_records(capture, 1)
+        if not records:
+            raise OSError("no records in %s" % capture)
+        from runtime import Runtime
+        local = records[0]["local"]
+        runtime = Runtime(None, None, [])
+        payload = runtime.build_payload(
+            records[0].get("timestamp", 0), local.get("temperature_c"),
+            local.get("humidity_percent"), local["light_lux"],
+            local.get("time_of_day", "Unknown")
+        )
+        return lambda: json.dumps(payload)
+    return setup
+
+
+class _SerialSink:
+    """
+    Serializes payloads inline, as the serial sink task would.
+    """
+
+    def __init__(self):
+        self.queue = self
+        self.line = None
+
+    def put_nowait(self, payload):
+        self.line = json.dumps(payload)
+        return True
+
+
+def _loop_case(capture):
+    def setup():
+        records = _load_records(capture)
+        if not records:
+            raise OSError("no records in %s" % capture)
+        from runtime import Runtime
+
+        sensors = _ReplaySensors(records)
+        runtime = Runtime(sensors, sensors, [_SerialSink()], clock=lambda: 0)
+
+        def step():
+            sensors.advance()
+            _run_coroutine(runtime.sample())
+        return step
+    return setup
+
+
+def build_cases(windows=WINDOWS, capture=DEFAULT_CAPTURE):
+    cases = []
+    for name in STATS_FUNCTIONS:
+        for window in windows:
+            cases.append(("stats.%s[%d]" % (name, window), _stats_case(name, window)))
+    for window in windows:
+        cases.append(("rolling.push_as_dict[%d]" % window, _rolling_case(window)))
+    for window in windows:
+        cases.append(("trend.from_trend[%d]" % window, _trend_case(window)))
+        cases.append(("trend.classifier[%d]" % window, _classifier_case(window)))
+    cases.append(("payload.json_dumps", _payload_case(capture)))
+    cases.append(("loop.iteration", _loop_case(capture)))
+    return cases
+
+
+# -----------------------------
+# Timing
+# -----------------------------
+def time_case(fn, min_time_us=100000, rounds=5):
+    """
+    Pick a loop count that runs for at least `min_time_us`, then take
+    `rounds` measurements. Returns per-call microseconds.
+    """
+    loops = 1
+    while True:
+        start = _now_us()
+        for _ in range(loops):
+            fn()
+        elapsed = _elapsed_us(start)
+        if elapsed >= min_time_us or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed * 4 > min_time_us else 8
+
+    samples = [elapsed / loops]
+    for _ in range(rounds - 1):
+        start = _now_us()
+        for _ in range(loops):
+            fn()
+        samples.append(_elapsed_us(start) / loops)
+    samples.sort()
+    return {
+        "per_call_us": samples[0],
+        "median_us": samples[len(samples) // 2],
+        "loops": loops,
+        "rounds": rounds
+    }
+
+
+def run_cases(cases, pattern=None, min_time_us=100000, rounds=5, emit=None):
+    """
+    Time every case whose name contains `pattern`. A case that cannot
+    be set up (MemoryError on a small board, missing capture) is
+    recorded with an "error" entry instead of aborting the run.
+    """
+    results = {}
+    for name, setup in cases:
+        if pattern and pattern not in name:
+            continue
+        try:
+            result = time_case(setup(), min_time_us, rounds)
+        except (MemoryError, OSError, ImportError) as e:
+            result = {"error": "%s: %s" % (type(e).__name__, e)}
+        results[name] = result
+        if emit is not None:
+            emit(name, result)
+    return results
+
+
+def worker(pattern=None, quick=False, capture=DEFAULT_CAPTURE):
+    """
+    Entry point for command runners: prints one BENCH line per case.
+    """
+    windows = QUICK_WINDOWS if quick else WINDOWS
+    min_time = 20000 if quick else 100000
+
+    def emit(name, result):
+        result["name"] = name
+        print(LINE_PREFIX + json.dumps(result))
+
+    run_cases(build_cases(windows, capture), pattern, min_time,
+              3 if quick else 5, emit)
+
+
+# -----------------------------
+# Runners
+# -----------------------------
+class LocalRunner:
+    """
+    Runs the cases in this interpreter.
+    """
+
+    def describe(self):
+        import platform
+        return "%s %s" % (platform.python_implementation(),
+                          platform.python_version())
+
+    def run(self, pattern, quick, capture):
+        windows = QUICK_WINDOWS if quick else WINDOWS
+        return run_cases(build_cases(windows, capture), pattern,
+                         20000 if quick else 100000, 3 if quick else 5,
+                         _progress)
+
+
+class CommandRunner:
+    """
+    Runs worker() under another interpreter, e.g. the MicroPython unix
+    port ("micropython -c {code}") or a board through mpremote
+    ("mpremote exec {code}"). Lines without the BENCH prefix (banners,
+    REPL noise) are ignored.
+    """
+
+    def __init__(self, template, cwd=None, timeout=3600):
+        self.template = template
+        self.cwd = cwd
+        self.timeout = timeout
+
+    def describe(self):
+        return self.template
+
+    def run(self, pattern, quick, capture):
+        import shlex
+        import subprocess
+
+        code = ("import sys\nsys.path.insert(0, '.')\nimport benchmark\n"
+                "benchmark.worker(%r, %r, %r)\n" % (pattern, quick, capture))
+        argv = [code if part == "{code}" else part
+                for part in shlex.split(self.template)]
+        if code not in argv:
+            raise ValueError("runner template needs a {code} placeholder")
+
+        proc = subprocess.run(argv, cwd=self.cwd, capture_output=True,
+                              text=True, timeout=self.timeout)
+        results = {}
+        for line in proc.stdout.splitlines():
+            if not line.startswith(LINE_PREFIX):
+                continue
+            result = json.loads(line[len(LINE_PREFIX):])
+            name = result.pop("name")
+            results[name] = result
+            _progress(name, result)
+        if proc.returncode != 0 and not results:
+            raise RuntimeError("runner failed (%d): %s"
+                               % (proc.returncode, proc.stderr.strip()))
+        return results
+
+
+def _progress(name, result):
+    if "error" in result:
+        print("%-34s %s" % (name, result["error"]), file=sys.stderr)
+    else:
+        print("%-34s %12.2f us" % (name, result["per_call_us"]), file=sys.stderr)
+
+
+# -----------------------------
+# Results
+# -----------------------------
+def save_results(path, runner, cases):
+    data = {
+        "version": RESULTS_VERSION,
+        "runner": runner,
+        "created": time.time(),
+        "cases": cases
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != RESULTS_VERSION:
+        raise ValueError("unsupported results version in %s" % path)
+    return data
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Return (rows, regressions). A case regresses when its best per-call
+    time exceeds the baseline by more than `threshold` (0.10 = 10%).
+    Cases present on only one side are reported but never fail.
+    """
+    rows = []
+    regressions = []
+    for name in sorted(set(baseline) | set(current)):
+        old = baseline.get(name, {}).get("per_call_us")
+        new = current.get(name, {}).get("per_call_us")
+        if old is None or new is None or old <= 0:
+            rows.append((name, old, new, None, ""))
+            continue
+        ratio = new / old
+        status = ""
+        if ratio > 1 + threshold:
+            status = "SLOWER"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = "faster"
+        rows.append((name, old, new, ratio, status))
+    return rows, regressions
+
+
+def _print_comparison(rows, regressions, threshold):
+    def fmt(value):
+        return "%12.2f" % value if value is not None else "%12s" % "-"
+
+    print("%-34s %12s %12s %8s" % ("case", "baseline us", "current us", "ratio"))
+    for name, old, new, ratio, status in rows:
+        print("%-34s %s %s %8s %s" % (
+            name, fmt(old), fmt(new),
+            "%.2fx" % ratio if ratio is not None else "-", status
+        ))
+    if regressions:
+        print("%d case(s) slower than the %.0f%% threshold"
+              % (len(regressions), threshold * 100))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="run the benchmarks")
+    p.add_argument("--out", help="write results as JSON")
+    p.add_argument("--filter", help="only run cases whose name contains this")
+    p.add_argument("--quick", action="store_true",
+                   help="fewer window sizes and shorter timings")
+    p.add_argument("--capture", default=DEFAULT_CAPTURE)
+    p.add_argument("--runner",
+                   help='command template with {code}, e.g. "micropython -c {code}"')
+    p.add_argument("--baseline", help="results file to compare against")
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                   help="allowed slowdown as a fraction (default 0.10)")
+
+    p = sub.add_parser("compare", help="compare two results files")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        rows, regressions = compare(load_results(args.baseline)["cases"],
+                                    load_results(args.current)["cases"],
+                                    args.threshold)
+        _print_comparison(rows, regressions, args.threshold)
+        return 1 if regressions else 0
+
+    runner = CommandRunner(args.runner) if args.runner else LocalRunner()
+    cases = runner.run(args.filter, args.quick, args.capture)
+    if args.out:
+        save_results(args.out, runner.describe(), cases)
+
+    if args.baseline:
+        rows, regressions = compare(load_results(args.baseline)["cases"],
+                                    cases, args.threshold)
+        _print_comparison(rows, regressions, args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
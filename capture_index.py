@@ -0,0 +1,339 @@
+"""
+capture_index.py
+Boot-segment index for JSONL captures (host side)
+
+The device timestamp is seconds since boot, so it jumps backwards after
+every reset. The indexer splits a capture into boot segments wherever
+that happens, gives every record a global sequence number, and writes a
+sidecar `<capture>.idx.json` with the byte offset of every block of N
+records plus per-block min/max of the timestamp and key fields. Blocks
+never straddle a segment, so range and predicate queries only read the
+blocks whose bounds can match.
+
+    python capture_index.py build esp32_weather.jsonl
+    python capture_index.py query esp32_weather.jsonl --segment 2 --from 100 --to 200
+"""
+
+import argparse
+import json
+import os
+import sys
+
+INDEX_VERSION = 1
+DEFAULT_FIELDS = (
+    "local.light_lux",
+    "local.temperature_c",
+    "local.humidity_percent"
+)
+
+
+def get_field(record, path):
+    value = record
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _parse(line):
+    if not line.startswith(b"{"):
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def _widen(bounds, value):
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return
+    if bounds[0] is None or value < bounds[0]:
+        bounds[0] = value
+    if bounds[1] is None or value > bounds[1]:
+        bounds[1] = value
+
+
+class CaptureIndex:
+    def __init__(self, capture, block_size=1024, fields=DEFAULT_FIELDS):
+        self.capture = capture
+        self.block_size = block_size
+        self.fields = list(fields)
+
+        self.segments = []
+        self.blocks = []
+        self.records = 0
+        self.skipped = 0
+        self.end_offset = 0
+        self._last_ts = None
+
+    @staticmethod
+    def sidecar_path(capture):
+        return capture + ".idx.json"
+
+    def update(self):
+        """
+        Index everything after end_offset; the first call indexes the
+        whole capture, later calls pick up appended lines.
+        """
+        block = None
+        with open(self.capture, "rb") as f:
+            f.seek(self.end_offset)
+            offset = self.end_offset
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Partial trailing line: leave it for the next update
+                    break
+                line_offset = offset
+                offset += len(line)
+
+                record = _parse(line.strip())
+                if record is None:
+                    self.skipped += 1
+                    continue
+
+                ts = record.get("timestamp")
+                if not self.segments or (
+                    isinstance(ts, (int, float))
+                    and self._last_ts is not None and ts < self._last_ts
+                ):
+                    self._start_segment(line_offset, ts)
+                    block = None
+                if isinstance(ts, (int, float)):
+                    self._last_ts = ts
+
+                if block is None:
+                    block = self._resume_block()
+                if block is None or block["count"] >= self.block_size:
+                    block = self._start_block(line_offset)
+
+                self._add(block, record, ts, offset)
+
+        self.end_offset = offset
+        return self
+
+    def _start_segment(self, offset, ts):
+        self.segments.append({
+            "segment": len(self.segments),
+            "seq_start": self.records,
+            "seq_end": self.records,
+            "offset": offset,
+            "ts_start": ts,
+            "ts_end": ts
+        })
+
+    def _resume_block(self):
+        # Continue the last block only if it belongs to the current segment
+        if not self.blocks:
+            return None
+        last = self.blocks[-1]
+        if last["segment"] != self.segments[-1]["segment"]:
+            return None
+        return last
+
+    def _start_block(self, offset):
+        block = {
+            "segment": self.segments[-1]["segment"],
+            "offset": offset,
+            "end": offset,
+            "seq": self.records,
+            "count": 0,
+            "ts": [None, None],
+            "fields": {name: [None, None] for name in self.fields}
+        }
+        self.blocks.append(block)
+        return block
+
+    def _add(self, block, record, ts, end):
+        block["count"] += 1
+        block["end"] = end
+        _widen(block["ts"], ts)
+        for name in self.fields:
+            _widen(block["fields"][name], get_field(record, name))
+
+        segment = self.segments[-1]
+        self.records += 1
+        segment["seq_end"] = self.records
+        if ts is not None:
+            segment["ts_end"] = ts
+
+    # --- persistence ------------------------------------------------
+
+    def save(self, path=None):
+        path = path or self.sidecar_path(self.capture)
+        data = {
+            "version": INDEX_VERSION,
+            "capture_size": self.end_offset,
+            "block_size": self.block_size,
+            "fields": self.fields,
+            "records": self.records,
+            "skipped": self.skipped,
+            "last_ts": self._last_ts,
+            "segments": self.segments,
+            "blocks": self.blocks
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, capture, path=None):
+        path = path or cls.sidecar_path(capture)
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError("unsupported index version")
+        index = cls(capture, data["block_size"], data["fields"])
+        index.segments = data["segments"]
+        index.blocks = data["blocks"]
+        index.records = data["records"]
+        index.skipped = data["skipped"]
+        index.end_offset = data["capture_size"]
+        index._last_ts = data["last_ts"]
+        return index
+
+    @classmethod
+    def open(cls, capture, block_size=1024, fields=DEFAULT_FIELDS):
+        """
+        Load the sidecar if present, bring it up to date and save it.
+        """
+        path = cls.sidecar_path(capture)
+        if os.path.exists(path):
+            index = cls.load(capture, path)
+            if os.path.getsize(capture) < index.end_offset:
+                # Capture was truncated or replaced: start over
+                index = cls(capture, block_size, fields)
+        else:
+            index = cls(capture, block_size, fields)
+
+        if os.path.getsize(capture) != index.end_offset:
+            index.update().save(path)
+        return index
+
+    # --- queries ----------------------------------------------------
+
+    def _block_matches(self, block, segment, seq_from, seq_to,
+                       ts_from, ts_to, where):
+        if segment is not None and block["segment"] != segment:
+            return False
+        if seq_from is not None and block["seq"] + block["count"] <= seq_from:
+            return False
+        if seq_to is not None and block["seq"] >= seq_to:
+            return False
+        lo, hi = block["ts"]
+        if ts_from is not None and (hi is None or hi < ts_from):
+            return False
+        if ts_to is not None and (lo is None or lo > ts_to):
+            return False
+        for name, (want_lo, want_hi) in where.items():
+            bounds = block["fields"].get(name)
+            if bounds is None:
+                continue
+            lo, hi = bounds
+            if lo is None:
+                return False
+            if want_lo is not None and hi < want_lo:
+                return False
+            if want_hi is not None and lo > want_hi:
+                return False
+        return True
+
+    def query(self, segment=None, seq_from=None, seq_to=None,
+              ts_from=None, ts_to=None, where=None):
+        """
+        Yield (seq, segment, record) for records matching every given
+        bound. Timestamp bounds are inclusive and are usually combined
+        with `segment`, since timestamps restart on every boot.
+        `where` maps field paths to inclusive (lo, hi) bounds; either
+        end may be None.
+        """
+        where = where or {}
+        with open(self.capture, "rb") as f:
+            for block in self.blocks:
+                if not self._block_matches(block, segment, seq_from, seq_to,
+                                           ts_from, ts_to, where):
+                    continue
+                f.seek(block["offset"])
+                data = f.read(block["end"] - block["offset"])
+                seq = block["seq"]
+                for line in data.split(b"\n"):
+                    record = _parse(line.strip())
+                    if record is None:
+                        continue
+                    if self._record_matches(record, seq, seq_from, seq_to,
+                                            ts_from, ts_to, where):
+                        yield seq, block["segment"], record
+                    seq += 1
+
+    @staticmethod
+    def _record_matches(record, seq, seq_from, seq_to, ts_from, ts_to, where):
+        if seq_from is not None and seq < seq_from:
+            return False
+        if seq_to is not None and seq >= seq_to:
+            return False
+        ts = record.get("timestamp")
+        if ts_from is not None and (ts is None or ts < ts_from):
+            return False
+        if ts_to is not None and (ts is None or ts > ts_to):
+            return False
+        for name, (lo, hi) in where.items():
+            value = get_field(record, name)
+            if value is None:
+                return False
+            if lo is not None and value < lo:
+                return False
+            if hi is not None and value > hi:
+                return False
+        return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="build or update the sidecar index")
+    p.add_argument("capture")
+    p.add_argument("--block-size", type=int, default=1024)
+    p.add_argument("--field", action="append", dest="fields",
+                   help="field path to keep min/max for (repeatable)")
+
+    p = sub.add_parser("query", help="print matching records as JSONL")
+    p.add_argument("capture")
+    p.add_argument("--segment", type=int)
+    p.add_argument("--from", dest="ts_from", type=float)
+    p.add_argument("--to", dest="ts_to", type=float)
+    p.add_argument("--where", action="append", default=[],
+                   metavar="FIELD:LO:HI",
+                   help="inclusive field bounds, either end may be empty")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        index = CaptureIndex.open(args.capture, args.block_size,
+                                  args.fields or DEFAULT_FIELDS)
+        print("%d records, %d segments, %d blocks (%d lines skipped)"
+              % (index.records, len(index.segments), len(index.blocks),
+                 index.skipped))
+        for seg in index.segments:
+            print("  segment %(segment)d: seq %(seq_start)d-%(seq_end)d, "
+                  "timestamp %(ts_start)s-%(ts_end)s" % seg)
+        return 0
+
+    where = {}
+    for spec in args.where:
+        name, lo, hi = spec.rsplit(":", 2)
+        where[name] = (float(lo) if lo else None, float(hi) if hi else None)
+
+    index = CaptureIndex.open(args.capture)
+    for seq, segment, record in index.query(args.segment, None, None,
+                                            args.ts_from, args.ts_to, where):
+        record["_seq"] = seq
+        record["_segment"] = segment
+        print(json.dumps(record))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
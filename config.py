@@ -7,10 +7,32 @@ SSID = "BenKimani"
 PASSWORD = "benkimani123"
 
 API_INTERVAL = 60
+SAMPLE_INTERVAL = 1.2
+# "json" lines or compact "binary" frames (see wire.py)
+SERIAL_FORMAT = "json"
+# Sinks that send keyframes + changed fields (see delta.py); only
+# "serial" supports it, since the other sinks hide lost messages
+DELTA_SINKS = ()
+KEYFRAME_EVERY = 60
 
 LUX_HISTORY_SIZE = 60
 DAY_THRESHOLD = 180
 NIGHT_THRESHOLD = 60
 TREND_EPSILON = 5
 
+LDR_OVERSAMPLE = 16
+LDR_REDUCER = "trimmed_mean"
+
 SD_MOUNT_POINT = "/sd"
+
+# Node-RED sink (see nodered.py); empty URL disables it
+NODE_RED_URL = ""
+
+# MQTT sink (see mqtt_sink.py); empty broker disables it
+STATION_ID = "esp32-nairobi-1"
+MQTT_BROKER = ""
+MQTT_PORT = 1883
+MQTT_PREFIX = "weather"
+MQTT_QOS = 1
+MQTT_BATCH = 10
+MQTT_OUTBOX = "mqtt_outbox.txt"
@@ -0,0 +1,7 @@
+# The modules live at the repo root, and statistics.py shadows the
+# standard library module of the same name
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.modules.pop("statistics", None)
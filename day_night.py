@@ -1,34 +1,116 @@
 from config import (
+    LUX_HISTORY_SIZE,
     DAY_THRESHOLD,
     NIGHT_THRESHOLD,
     TREND_EPSILON
 )
+from ring_buffer import RingBuffer
 
-_last_state = "Unknown"
+MIN_TREND_SAMPLES = 10
 
-def time_of_day_from_trend(lux_history):
-    if len(lux_history) < 10:
-        return "Unknown"
+_last_state = "Unknown"
 
-    mid = len(lux_history) // 2
-    first = sum(lux_history[:mid]) / mid
-    second = sum(lux_history[mid:]) / (len(lux_history) - mid)
+def _classify(first, second, day_threshold, night_threshold, epsilon):
     delta = second - first
 
-    if second > DAY_THRESHOLD and delta > TREND_EPSILON:
+    if second > day_threshold and delta > epsilon:
         return "Day"
-    if second < NIGHT_THRESHOLD and delta < -TREND_EPSILON:
+    if second < night_threshold and delta < -epsilon:
         return "Night"
-    if delta < -TREND_EPSILON:
+    if delta < -epsilon:
         return "Approaching Night"
-    if delta > TREND_EPSILON:
+    if delta > epsilon:
         return "Approaching Day"
 
     return "Stable"
 
 
+def time_of_day_from_trend(lux_history, day_threshold=DAY_THRESHOLD,
+                           night_threshold=NIGHT_THRESHOLD,
+                           epsilon=TREND_EPSILON):
+    if len(lux_history) < MIN_TREND_SAMPLES:
+        return "Unknown"
+
+    mid = len(lux_history) // 2
+    first = sum(lux_history[:mid]) / mid
+    second = sum(lux_history[mid:]) / (len(lux_history) - mid)
+
+    return _classify(first, second, day_threshold, night_threshold, epsilon)
+
+
 def stable_time_state(new_state):
     global _last_state
     if new_state in ("Day", "Night"):
         _last_state = new_state
     return _last_state
+
+
+class TrendClassifier:
+    """
+    Incremental version of time_of_day_from_trend.
+
+    Keeps running sums for the older and newer half of the window and
+    moves the boundary sample between them on each push, so a sample
+    costs O(1) whatever the window length. The hysteresis state of
+    stable_time_state is held per instance instead of globally.
+    """
+
+    def __init__(self, capacity=LUX_HISTORY_SIZE,
+                 day_threshold=DAY_THRESHOLD,
+                 night_threshold=NIGHT_THRESHOLD,
+                 epsilon=TREND_EPSILON):
+        self.day_threshold = day_threshold
+        self.night_threshold = night_threshold
+        self.epsilon = epsilon
+        self.state = "Unknown"
+
+        self._history = RingBuffer(capacity, "d")
+        self._first_sum = 0.0
+        self._second_sum = 0.0
+
+    def __len__(self):
+        return len(self._history)
+
+    def push(self, lux):
+        """
+        Add a sample and return the raw trend label.
+        """
+        history = self._history
+        first_count = len(history) // 2
+
+        if history.is_full():
+            self._first_sum -= history[0]
+            first_count -= 1
+
+        history.append(lux)
+        self._second_sum += lux
+
+        if first_count < len(history) // 2:
+            boundary = history[first_count]
+            self._first_sum += boundary
+            self._second_sum -= boundary
+
+        return self.trend()
+
+    def trend(self):
+        n = len(self._history)
+        if n < MIN_TREND_SAMPLES:
+            return "Unknown"
+
+        mid = n // 2
+        return _classify(
+            self._first_sum / mid,
+            self._second_sum / (n - mid),
+            self.day_threshold,
+            self.night_threshold,
+            self.epsilon
+        )
+
+    def update(self, lux):
+        """
+        Add a sample and return the hysteresis-stabilised state.
+        """
+        new_state = self.push(lux)
+        if new_state in ("Day", "Night"):
+            self.state = new_state
+        return self.state
@@ -0,0 +1,238 @@
+"""
+delta.py
+Keyframe + changed-fields payload mode
+
+Most of a payload repeats from one sample to the next: the api block
+only changes on a weather refresh and lux_min/lux_max/lux_range stay put
+for long stretches. DeltaEncoder sends a full keyframe every N samples
+and otherwise only the leaves that changed:
+
+    {"_seq": 120, "_key": 1, "timestamp": ..., "local": {...}, ...}
+    {"_seq": 121, "timestamp": ..., "local": {"light_lux": 41.2}}
+    {"_seq": 122, "timestamp": ..., "_del": [["api", "age_s"]]}
+
+Deltas are relative to the previous message, so DeltaDecoder drops
+everything after a lost message until the next keyframe. Messages
+without `_seq` are ordinary payloads and pass through untouched.
+An encoder given a station id tags every message with `_station`;
+StationDecoders keeps one DeltaDecoder per station so a receiver shared
+by several devices never mixes their sequences.
+
+    python delta.py encode esp32_weather.jsonl deltas.jsonl --every 60
+    python delta.py decode deltas.jsonl > rebuilt.jsonl
+"""
+
+import json
+
+SEQ = "_seq"
+KEY = "_key"
+DELETED = "_del"
+STATION = "_station"
+
+_MISSING = object()
+
+
+def is_delta(message):
+    return isinstance(message, dict) and SEQ in message
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    return value
+
+
+def _diff(old, new, path, deleted):
+    changes = {}
+    for key, value in new.items():
+        before = old.get(key, _MISSING)
+        if isinstance(value, dict) and isinstance(before, dict):
+            sub = _diff(before, value, path + [key], deleted)
+            if sub:
+                changes[key] = sub
+        elif (before is _MISSING or before != value
+              or type(before) is not type(value)):
+            changes[key] = _copy(value)
+    for key in old:
+        if key not in new:
+            deleted.append(path + [key])
+    return changes
+
+
+def _merge(target, changes):
+    for key, value in changes.items():
+        current = target.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            _merge(current, value)
+        else:
+            target[key] = _copy(value)
+
+
+def _delete(target, path):
+    for key in path[:-1]:
+        target = target.get(key)
+        if not isinstance(target, dict):
+            return
+    target.pop(path[-1], None)
+
+
+class DeltaEncoder:
+    """
+    Device side: turn consecutive payloads into keyframes and deltas.
+    """
+
+    def __init__(self, keyframe_every=60, station=None):
+        if keyframe_every < 1:
+            raise ValueError("keyframe_every must be at least 1")
+        self.keyframe_every = keyframe_every
+        self.station = station
+        self.seq = 0
+        self._last = None
+        self._since_key = 0
+
+    def reset(self):
+        """
+        Make the next message a keyframe, e.g. after a failed send.
+        """
+        self._last = None
+
+    def encode(self, payload):
+        if self._last is None or self._since_key >= self.keyframe_every:
+            message = dict(payload)
+            message[KEY] = 1
+            self._since_key = 0
+        else:
+            deleted = []
+            message = _diff(self._last, payload, [], deleted)
+            if deleted:
+                message[DELETED] = deleted
+        message[SEQ] = self.seq
+        if self.station is not None:
+            message[STATION] = self.station
+
+        self._last = _copy(payload)
+        self._since_key += 1
+        self.seq += 1
+        return message
+
+
+class DeltaDecoder:
+    """
+    Host side: rebuild full payloads. apply() returns the payload, or
+    None while it waits for a keyframe after a gap.
+    """
+
+    def __init__(self):
+        self._state = None
+        self.last_seq = None
+
+        self.keyframes = 0
+        self.deltas = 0
+        self.gaps = 0
+        self.dropped = 0
+
+    def apply(self, message):
+        if not is_delta(message):
+            return message
+
+        changes = dict(message)
+        changes.pop(STATION, None)
+        seq = changes.pop(SEQ)
+        keyframe = changes.pop(KEY, None)
+        deleted = changes.pop(DELETED, ())
+
+        if keyframe:
+            self._state = _copy(changes)
+            self.keyframes += 1
+        else:
+            if self._state is None or seq != self.last_seq + 1:
+                if self._state is not None:
+                    self.gaps += 1
+                    self._state = None
+                self.dropped += 1
+                return None
+            _merge(self._state, changes)
+            for path in deleted:
+                _delete(self._state, path)
+            self.deltas += 1
+
+        self.last_seq = seq
+        return _copy(self._state)
+
+
+class StationDecoders:
+    """
+    One DeltaDecoder per `_station`; untagged messages share the
+    decoder stored under None.
+    """
+
+    def __init__(self):
+        self.decoders = {}
+
+    def apply(self, message):
+        if not is_delta(message):
+            return message
+        station = message.get(STATION)
+        decoder = self.decoders.get(station)
+        if decoder is None:
+            decoder = self.decoders[station] = DeltaDecoder()
+        return decoder.apply(message)
+
+
+def main(argv=None):
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("encode", help="turn a JSONL capture into deltas")
+    p.add_argument("capture")
+    p.add_argument("out")
+    p.add_argument("--every", type=int, default=60,
+                   help="samples between keyframes")
+
+    p = sub.add_parser("decode", help="rebuild full records from deltas")
+    p.add_argument("deltas")
+    p.add_argument("--out", help="write JSONL here instead of stdout")
+
+    args = parser.parse_args(argv)
+
+    from replay import read_jsonl
+
+    if args.command == "encode":
+        encoder = DeltaEncoder(args.every)
+        full_bytes = 0
+        delta_bytes = 0
+        with open(args.out, "w") as out:
+            for record in read_jsonl(args.capture):
+                line = json.dumps(encoder.encode(record)) + "\n"
+                full_bytes += len(json.dumps(record)) + 1
+                delta_bytes += len(line)
+                out.write(line)
+        print("%d samples: %d bytes full -> %d bytes delta (%.1fx)"
+              % (encoder.seq, full_bytes, delta_bytes,
+                 full_bytes / delta_bytes if delta_bytes else 0),
+              file=sys.stderr)
+        return 0
+
+    decoder = DeltaDecoder()
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        for message in read_jsonl(args.deltas):
+            payload = decoder.apply(message)
+            if payload is not None:
+                out.write(json.dumps(payload) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print("%d keyframes, %d deltas, %d gaps, %d dropped"
+          % (decoder.keyframes, decoder.deltas, decoder.gaps, decoder.dropped),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
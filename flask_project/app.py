@@ -1,34 +1,170 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+
 from flask import Flask, request, jsonify
 
+from store import TimeSeriesStore, validate
+
+# delta.py is shared with the device code one directory up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from delta import StationDecoders, is_delta  # noqa: E402
+
 app = Flask(__name__)
 
-# In-memory storage (later → CSV or database)
-latest_data = {
-    "temperature": None,
-    "humidity": None,
-    "light": None
-}
+# Every POSTed payload is kept here; GET without a range still returns
+# just the latest values
+DB_PATH = os.environ.get(
+    "WEATHER_DB", os.path.join(os.path.dirname(__file__), "weather.db")
+)
+store = TimeSeriesStore(DB_PATH)
+
+# Devices in delta mode send keyframes + changed fields; rebuild them
+# into full payloads, per station, before they reach the store
+deltas = StationDecoders()
+deltas_lock = threading.Lock()
+
+DEFAULT_RANGE = 3600
+MAX_POINTS = 500
+MAX_BATCH = 10000
+# How far past the current time `to` may reach
+MAX_FUTURE = 366 * 86400
 
 # ---------------------------
 # ESP32 → Flask (POST data)
 # ---------------------------
 @app.route("/api/data", methods=["POST"])
 def receive_data():
-    global latest_data
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"status": "error", "error": "expected a JSON object"}), 400
+
+    if is_delta(data):
+        with deltas_lock:
+            data = deltas.apply(data)
+        if data is None:
+            return jsonify({"status": "error", "error": "waiting for keyframe"}), 409
 
-    latest_data["temperature"] = data.get("temperature")
-    latest_data["humidity"] = data.get("humidity")
-    latest_data["light"] = data.get("light")
+    error = validate(data)
+    if error:
+        return jsonify({"status": "error", "error": error}), 400
+
+    store.insert(time.time(), data)
 
     return jsonify({"status": "ok"}), 200
 
+
+def parse_batch(body):
+    """
+    Accept a JSON array or NDJSON (one object per line).
+    Lines that are not valid JSON are kept as None so they are
+    reported by index instead of failing the whole batch.
+    """
+    text = body.decode("utf-8").strip()
+    if text.startswith("["):
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("expected a JSON array")
+        return items
+
+    items = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(None)
+    return items
+
+
+# ---------------------------
+# ESP32 → Flask (bulk POST)
+# ---------------------------
+@app.route("/api/data/batch", methods=["POST"])
+def receive_batch():
+    """
+    Insert many samples in one transaction.
+
+    Samples carrying `received_at` are stored at that time, the rest at
+    the time of this request. The response lists rejected items by index.
+    """
+    try:
+        items = parse_batch(request.get_data())
+    except ValueError as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+    if len(items) > MAX_BATCH:
+        return jsonify({"status": "error",
+                        "error": "batch larger than %d samples" % MAX_BATCH}), 413
+
+    accepted = []
+    rejected = []
+    for i, item in enumerate(items):
+        if is_delta(item):
+            with deltas_lock:
+                item = deltas.apply(item)
+            if item is None:
+                rejected.append({"index": i, "error": "waiting for keyframe"})
+                continue
+        error = validate(item) if item is not None else "invalid JSON"
+        if error:
+            rejected.append({"index": i, "error": error})
+        else:
+            accepted.append(item)
+
+    ids = store.insert_many(time.time(), accepted) if accepted else []
+
+    return jsonify({
+        "status": "ok",
+        "received": len(items),
+        "accepted": len(ids),
+        "rejected": rejected,
+        "first_id": ids[0] if ids else None,
+        "last_id": ids[-1] if ids else None
+    }), 200
+
 # ---------------------------
 # Browser → Flask (GET data)
 # ---------------------------
 @app.route("/api/data", methods=["GET"])
 def send_data():
-    return jsonify(latest_data)
+    args = request.args
+    if not any(key in args for key in ("from", "to", "step")):
+        return jsonify(store.latest())
+
+    try:
+        ts_to = float(args.get("to", time.time()))
+        ts_from = float(args.get("from", ts_to - DEFAULT_RANGE))
+        step = float(args["step"]) if "step" in args else None
+    except ValueError:
+        return jsonify({"status": "error", "error": "from/to/step must be numbers"}), 400
+    # float() takes "nan" and "inf", which would come back as invalid JSON
+    if not all(math.isfinite(v) for v in (ts_from, ts_to, step or 0)):
+        return jsonify({"status": "error", "error": "from/to/step must be numbers"}), 400
+
+    if ts_to <= ts_from:
+        return jsonify({"status": "error", "error": "to must be after from"}), 400
+    if ts_from < 0 or ts_to > time.time() + MAX_FUTURE:
+        return jsonify({"status": "error", "error": "from/to out of range"}), 400
+
+    # Never hand back more than MAX_POINTS buckets
+    min_step = (ts_to - ts_from) / MAX_POINTS
+    if step is None or step < min_step:
+        step = max(min_step, 1)
+
+    tier = store.pick_tier(step)
+    return jsonify({
+        "from": ts_from,
+        "to": ts_to,
+        "step": step,
+        "source": tier[0] if tier else "raw",
+        "series": store.query(ts_from, ts_to, step)
+    })
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001, debug=True)
@@ -0,0 +1,432 @@
+import json
+import math
+import sqlite3
+import threading
+
+FIELDS = ("temperature", "humidity", "light")
+
+# Optional per-sample wall-clock time (Unix seconds) set by the sender;
+# samples without it are stamped with the server's receive time
+RECEIVED_AT = "received_at"
+
+# Latest timestamp a range query looks at (about year 36800); keeps
+# bucket indices well inside SQLite's 64-bit INTEGER
+MAX_TIMESTAMP = float(2 ** 40)
+
+# (table suffix, bucket width in seconds), finest first
+ROLLUP_TIERS = (
+    ("1m", 60),
+    ("1h", 3600),
+    ("1d", 86400),
+)
+
+# Histogram sketch bins per field: (low, high, bin width)
+SKETCH_BINS = {
+    "temperature": (-40.0, 85.0, 0.5),
+    "humidity": (0.0, 100.0, 0.5),
+    "light": (0.0, 1000.0, 5.0),
+}
+
+# Where each field lives in the device payload, flat name first
+_SOURCES = {
+    "temperature": (("temperature",), ("local", "temperature_c")),
+    "humidity": (("humidity",), ("local", "humidity_percent")),
+    "light": (("light",), ("local", "light_lux")),
+}
+
+
+def _lookup(payload, path):
+    value = payload
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def normalize(payload):
+    """
+    Pull temperature/humidity/light out of either the flat
+    {"temperature", "humidity", "light"} body or the device payload.
+    """
+    fields = {}
+    for name in FIELDS:
+        value = None
+        for path in _SOURCES[name]:
+            value = _lookup(payload, path)
+            if value is not None:
+                break
+        fields[name] = value
+    return fields
+
+
+class HistogramSketch:
+    """
+    Fixed-bin histogram used as a mergeable quantile sketch.
+
+    Bins cover the sensor's physical range, so two sketches merge
+    exactly by adding counts and memory is bounded by the bin count.
+    Quantiles are accurate to one bin width.
+    """
+
+    def __init__(self, low, high, width, counts=None):
+        self.low = low
+        self.high = high
+        self.width = width
+        self.bins = int(math.ceil((high - low) / width))
+        self.counts = counts if counts is not None else {}
+
+    @classmethod
+    def for_field(cls, field, counts=None):
+        low, high, width = SKETCH_BINS[field]
+        return cls(low, high, width, counts)
+
+    def add(self, x, n=1):
+        i = int((x - self.low) // self.width)
+        i = min(max(i, 0), self.bins - 1)
+        self.counts[i] = self.counts.get(i, 0) + n
+
+    def merge(self, other):
+        for i, n in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + n
+
+    def quantile(self, q):
+        total = sum(self.counts.values())
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return self.low + (i + 0.5) * self.width
+        return self.low + (max(self.counts) + 0.5) * self.width
+
+    def dumps(self):
+        return json.dumps(self.counts, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, field, text):
+        return cls.for_field(
+            field, {int(i): n for i, n in json.loads(text).items()}
+        )
+
+
+class _Rollup:
+    def __init__(self, field):
+        self.field = field
+        self.count = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = HistogramSketch.for_field(field)
+
+    @classmethod
+    def from_row(cls, field, row):
+        agg = cls(field)
+        agg.count, agg.sum, agg.sumsq, agg.min, agg.max = row[:5]
+        agg.sketch = HistogramSketch.loads(field, row[5])
+        return agg
+
+    def add(self, x):
+        self.count += 1
+        self.sum += x
+        self.sumsq += x * x
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+        self.sketch.add(x)
+
+    def merge(self, other):
+        if not other.count:
+            return
+        self.count += other.count
+        self.sum += other.sum
+        self.sumsq += other.sumsq
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        self.sketch.merge(other.sketch)
+
+    def summary(self):
+        mean = self.sum / self.count
+        var = max(self.sumsq / self.count - mean * mean, 0.0)
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": mean,
+            "std": var ** 0.5,
+            "p05": self.sketch.quantile(0.05),
+            "p50": self.sketch.quantile(0.5),
+            "p95": self.sketch.quantile(0.95)
+        }
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def sample_time(payload, default):
+    """
+    The sample's own `received_at`, or `default` when it has none.
+    """
+    value = payload.get(RECEIVED_AT)
+    return value if _is_number(value) else default
+
+
+def validate(payload):
+    """
+    Return an error message for an unusable sample, or None.
+    """
+    if not isinstance(payload, dict):
+        return "expected a JSON object"
+    received_at = payload.get(RECEIVED_AT)
+    if received_at is not None and not (_is_number(received_at)
+                                        and math.isfinite(received_at)):
+        return "%s must be a number" % RECEIVED_AT
+    fields = normalize(payload)
+    if all(value is None for value in fields.values()):
+        return "no temperature, humidity or light value"
+    for name, value in fields.items():
+        if value is not None and not _is_number(value):
+            return "%s must be a number" % name
+    return None
+
+
+class TimeSeriesStore:
+    """
+    SQLite (WAL) store of every received payload, indexed by receive time.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS samples ("
+                " id INTEGER PRIMARY KEY,"
+                " ts REAL NOT NULL,"
+                " temperature REAL,"
+                " humidity REAL,"
+                " light REAL,"
+                " payload TEXT NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts)"
+            )
+            for name, _ in ROLLUP_TIERS:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS rollup_%s ("
+                    " bucket INTEGER NOT NULL,"
+                    " field TEXT NOT NULL,"
+                    " count INTEGER NOT NULL,"
+                    " sum REAL NOT NULL,"
+                    " sumsq REAL NOT NULL,"
+                    " min REAL,"
+                    " max REAL,"
+                    " sketch TEXT NOT NULL,"
+                    " PRIMARY KEY (bucket, field)) WITHOUT ROWID" % name
+                )
+            self._db.commit()
+
+            # Databases created before the rollup tiers existed
+            has_samples = self._db.execute(
+                "SELECT 1 FROM samples LIMIT 1").fetchone()
+            has_rollups = self._db.execute(
+                "SELECT 1 FROM rollup_%s LIMIT 1" % ROLLUP_TIERS[0][0]
+            ).fetchone()
+            if has_samples and not has_rollups:
+                self._rebuild_rollups()
+
+    def insert(self, ts, payload):
+        return self.insert_many(ts, [payload])[0]
+
+    def insert_many(self, ts, payloads):
+        """
+        Insert a batch in one transaction and return the new row ids.
+        Each sample is filed under its own `received_at` when it has one,
+        so a backlog flushed in one request keeps its real spacing; `ts`
+        is the fallback.
+        """
+        rows = []
+        for payload in payloads:
+            fields = normalize(payload)
+            rows.append((sample_time(payload, ts), fields["temperature"], fields["humidity"],
+                         fields["light"], json.dumps(payload)))
+
+        ids = []
+        with self._lock:
+            try:
+                for row in rows:
+                    cur = self._db.execute(
+                        "INSERT INTO samples"
+                        " (ts, temperature, humidity, light, payload)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        row
+                    )
+                    ids.append(cur.lastrowid)
+                self._update_rollups(
+                    (row[0], row[1:4]) for row in rows
+                )
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+        return ids
+
+    def _update_rollups(self, samples):
+        """
+        Fold (ts, (temperature, humidity, light)) samples into every
+        tier. Runs inside the caller's transaction.
+        """
+        pending = {name: {} for name, _ in ROLLUP_TIERS}
+        for ts, values in samples:
+            for name, width in ROLLUP_TIERS:
+                bucket = int(ts // width)
+                tier = pending[name]
+                for field, value in zip(FIELDS, values):
+                    if value is None:
+                        continue
+                    key = (bucket, field)
+                    agg = tier.get(key)
+                    if agg is None:
+                        agg = tier[key] = _Rollup(field)
+                    agg.add(value)
+
+        for name, tier in pending.items():
+            for (bucket, field), agg in tier.items():
+                row = self._db.execute(
+                    "SELECT count, sum, sumsq, min, max, sketch"
+                    " FROM rollup_%s WHERE bucket = ? AND field = ?" % name,
+                    (bucket, field)
+                ).fetchone()
+                if row is not None:
+                    agg.merge(_Rollup.from_row(field, row))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO rollup_%s"
+                    " (bucket, field, count, sum, sumsq, min, max, sketch)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)" % name,
+                    (bucket, field, agg.count, agg.sum, agg.sumsq,
+                     agg.min, agg.max, agg.sketch.dumps())
+                )
+
+    def _rebuild_rollups(self):
+        for name, _ in ROLLUP_TIERS:
+            self._db.execute("DELETE FROM rollup_%s" % name)
+        cur = self._db.execute(
+            "SELECT ts, temperature, humidity, light FROM samples ORDER BY ts"
+        )
+        while True:
+            rows = cur.fetchmany(10000)
+            if not rows:
+                break
+            self._update_rollups((row[0], row[1:]) for row in rows)
+        self._db.commit()
+
+    def latest(self):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT temperature, humidity, light FROM samples"
+                " ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        if row is None:
+            return {name: None for name in FIELDS}
+        return dict(zip(FIELDS, row))
+
+    @staticmethod
+    def pick_tier(step):
+        """
+        Coarsest rollup tier no wider than `step`, or None for raw rows.
+        """
+        chosen = None
+        for name, width in ROLLUP_TIERS:
+            if width <= step:
+                chosen = (name, width)
+        return chosen
+
+    def query(self, ts_from, ts_to, step):
+        """
+        Downsample [ts_from, ts_to) into buckets of `step` seconds.
+        Empty buckets are omitted.
+
+        Steps of a minute or more are served from the coarsest rollup
+        tier that fits, which adds std and p05/p50/p95 per field; rollup
+        buckets are assigned whole by their start time. Finer steps
+        aggregate the raw samples.
+        """
+        tier = self.pick_tier(step)
+        if tier is None:
+            return self._query_raw(ts_from, ts_to, step)
+        return self._query_rollup(tier, ts_from, ts_to, step)
+
+    def _query_raw(self, ts_from, ts_to, step):
+        columns = ", ".join(
+            "COUNT({0}), MIN({0}), MAX({0}), AVG({0}), AVG({0} * {0})".format(name)
+            for name in FIELDS
+        )
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT CAST((ts - ?) / ? AS INTEGER) AS bucket, COUNT(*), "
+                + columns +
+                " FROM samples WHERE ts >= ? AND ts < ?"
+                " GROUP BY bucket ORDER BY bucket",
+                (ts_from, step, ts_from, ts_to)
+            ).fetchall()
+
+        series = []
+        for row in rows:
+            point = {"ts": ts_from + row[0] * step, "count": row[1]}
+            for i, name in enumerate(FIELDS):
+                count, lo, hi, avg, avg_sq = row[2 + 5 * i:7 + 5 * i]
+                std = None
+                if count:
+                    std = max(avg_sq - avg * avg, 0.0) ** 0.5
+                point[name] = {"count": count, "min": lo, "max": hi,
+                               "mean": avg, "std": std}
+            series.append(point)
+        return series
+
+    def _query_rollup(self, tier, ts_from, ts_to, step):
+        name, width = tier
+        low = min(max(ts_from, 0.0), MAX_TIMESTAMP)
+        high = min(max(ts_to, 0.0), MAX_TIMESTAMP)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT bucket, field, count, sum, sumsq, min, max, sketch"
+                " FROM rollup_%s WHERE bucket >= ? AND bucket < ?"
+                " ORDER BY bucket" % name,
+                (int(low // width), int(math.ceil(high / width)))
+            ).fetchall()
+
+        buckets = {}
+        for row in rows:
+            index = max(int((row[0] * width - ts_from) // step), 0)
+            fields = buckets.setdefault(index, {})
+            agg = _Rollup.from_row(row[1], row[2:])
+            if row[1] in fields:
+                fields[row[1]].merge(agg)
+            else:
+                fields[row[1]] = agg
+
+        series = []
+        for index in sorted(buckets):
+            fields = buckets[index]
+            point = {
+                "ts": ts_from + index * step,
+                "count": max(agg.count for agg in fields.values())
+            }
+            for field in FIELDS:
+                agg = fields.get(field)
+                point[field] = agg.summary() if agg is not None else None
+            series.append(point)
+        return series
+
+    def close(self):
+        with self._lock:
+            self._db.close()
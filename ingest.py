@@ -0,0 +1,525 @@
+"""
+ingest.py
+Serial ingestion daemon (host side)
+
+Reads the ESP32 stream from a serial port, a pty or a capture file with
+large reads, and hands whole chunks to a parser thread that splits
+lines (or wire.py frames), skips banners and garbled lines, rebuilds
+delta.py messages and tracks reboots and lost samples. Every record is
+stamped with `received_at` (wall-clock read time) and fanned out to
+independent sink threads, each with its own bounded queue, so a slow
+Flask or Node-RED endpoint drops its own backlog instead of stalling
+the reader.
+
+    python ingest.py /dev/ttyUSB0 --jsonl logs --flask http://localhost:5001
+    python ingest.py esp32_weather.jsonl --jsonl /tmp/out --stats-every 0
+    python ingest.py /dev/ttyUSB0 --format binary --nodered http://nodered:1880/ui
+"""
+
+import argparse
+import collections
+import json
+import os
+import select
+import sys
+import threading
+import time
+import urllib.request
+
+from config import SAMPLE_INTERVAL
+from delta import StationDecoders, SEQ
+from logger import BufferedJsonlLogger, FSYNC_INTERVAL
+
+READ_SIZE = 65536
+MAX_LINE = 65536
+FLASK_BATCH = 200
+
+
+# -----------------------------
+# Sources
+# -----------------------------
+class FileSource:
+    """
+    Non-blocking reads from a pty, FIFO or regular file. A regular file
+    ends at EOF unless `follow` is set, in which case it is tailed.
+    """
+
+    def __init__(self, path, follow=False):
+        self.path = path
+        self.follow = follow
+        self.fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        self.regular = os.path.isfile(path)
+
+    def read(self, timeout):
+        """
+        Return the next chunk, b"" when nothing arrived within
+        `timeout`, or None at end of stream.
+        """
+        if not self.regular:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+            if not ready:
+                return b""
+        try:
+            chunk = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return b""
+        except OSError:
+            # pty whose other end went away
+            return None
+        if chunk:
+            return chunk
+        if self.regular and self.follow:
+            time.sleep(timeout)
+            return b""
+        return None
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SerialSource:
+    """
+    A real serial port through pyserial.
+    """
+
+    def __init__(self, port, baud):
+        import serial  # pyserial, only needed for real ports
+        self.port = serial.Serial(port, baud, timeout=0)
+
+    def read(self, timeout):
+        ready, _, _ = select.select([self.port.fileno()], [], [], timeout)
+        if not ready:
+            return b""
+        return self.port.read(max(self.port.in_waiting, 1))
+
+    def close(self):
+        self.port.close()
+
+
+def open_source(path, baud=115200, follow=False):
+    """
+    Serial devices go through pyserial when it is installed; ptys,
+    FIFOs and files (and ttys without pyserial) are read directly.
+    """
+    if path.startswith("/dev/") and not os.path.isfile(path):
+        try:
+            return SerialSource(path, baud)
+        except ImportError:
+            pass
+    return FileSource(path, follow)
+
+
+# -----------------------------
+# Parsing
+# -----------------------------
+class LineParser:
+    """
+    Split chunks on newlines and parse JSON objects. Anything else is
+    counted as a banner (printable text) or garbled.
+    """
+
+    def __init__(self):
+        self._tail = b""
+        self._deltas = StationDecoders()
+        self.banners = []
+        self.lines = 0
+        self.garbled = 0
+        self.waiting = 0
+
+    def feed(self, chunk):
+        """
+        Return [(seq, record)] for the complete lines in `chunk`; seq is
+        None unless the device sends delta messages.
+        """
+        lines = (self._tail + chunk).split(b"\n")
+        self._tail = lines.pop()
+        if len(self._tail) > MAX_LINE:
+            # No newline for far too long: drop it and resync
+            self.garbled += 1
+            self._tail = b""
+
+        out = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            self.lines += 1
+            if not line.startswith(b"{"):
+                self._not_json(line)
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self.garbled += 1
+                continue
+            if not isinstance(record, dict):
+                self.garbled += 1
+                continue
+
+            seq = record.get(SEQ)
+            record = self._deltas.apply(record)
+            if record is None:
+                self.waiting += 1
+                continue
+            out.append((seq, record))
+        return out
+
+    def _not_json(self, line):
+        try:
+            text = line.decode("utf-8")
+        except UnicodeError:
+            self.garbled += 1
+            return
+        if text.isprintable():
+            self.banners.append(text)
+        else:
+            self.garbled += 1
+
+    def take_banners(self):
+        banners = self.banners
+        self.banners = []
+        return banners
+
+
+class FrameParser:
+    """
+    wire.py binary frames; the decoder does its own resync.
+    """
+
+    def __init__(self):
+        from wire import FrameDecoder
+        self.decoder = FrameDecoder()
+
+    def feed(self, chunk):
+        return self.decoder.feed(chunk)
+
+    def take_banners(self):
+        return []
+
+
+class SequenceTracker:
+    """
+    Detect reboots and lost samples.
+
+    With a sequence number (delta or binary mode) a jump forward counts
+    the missing samples exactly and a jump backwards is a reboot.
+    Without one, a backwards timestamp or a start-up banner marks a
+    reboot, and a timestamp gap wider than `gap_factor` sample
+    intervals estimates how many samples went missing.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, gap_factor=2.5):
+        self.interval = interval
+        self.gap_factor = gap_factor
+        self.last_seq = None
+        self.last_ts = None
+        self.records = 0
+        self.reboots = 0
+        self.gaps = 0
+        self.missed = 0
+        self._banner = False
+
+    def banner(self, text):
+        if "STARTED" in text or "MODE" in text:
+            self._banner = True
+
+    def observe(self, seq, ts):
+        """
+        Return "reboot", "gap" or None for this record.
+        """
+        self.records += 1
+        event = None
+        seen = self.last_seq is not None or self.last_ts is not None
+
+        if seen and self._banner:
+            event = "reboot"
+        elif seq is not None and self.last_seq is not None:
+            if seq <= self.last_seq:
+                event = "reboot"
+            elif seq > self.last_seq + 1:
+                event = "gap"
+                self.missed += seq - self.last_seq - 1
+        elif isinstance(ts, (int, float)) and self.last_ts is not None:
+            if ts < self.last_ts:
+                event = "reboot"
+            elif ts - self.last_ts > self.gap_factor * self.interval:
+                event = "gap"
+                self.missed += max(int(round((ts - self.last_ts) / self.interval)) - 1, 1)
+
+        if event == "reboot":
+            self.reboots += 1
+        elif event == "gap":
+            self.gaps += 1
+
+        self._banner = False
+        if seq is not None:
+            self.last_seq = seq
+        if isinstance(ts, (int, float)):
+            self.last_ts = ts
+        return event
+
+
+# -----------------------------
+# Sinks
+# -----------------------------
+class SinkWorker:
+    """
+    One thread per sink behind a bounded queue that drops the oldest
+    record when full. With batch > 1, send() receives a list. Failed
+    sends are counted and back off exponentially; their records are
+    dropped. `on_close` runs once the queue is drained.
+    """
+
+    def __init__(self, name, send, maxsize=1000, batch=1,
+                 min_backoff=1, max_backoff=60, on_close=None):
+        self.name = name
+        self.send = send
+        self.on_close = on_close
+        self.batch = batch
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+
+        self._queue = collections.deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="sink-" + name,
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def put(self, record):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(record)
+            self._cond.notify()
+
+    def pending(self):
+        return len(self._queue)
+
+    def _take(self):
+        with self._cond:
+            while not self._queue and not self._closing:
+                self._cond.wait()
+            items = []
+            while self._queue and len(items) < self.batch:
+                items.append(self._queue.popleft())
+            return items
+
+    def _run(self):
+        failures = 0
+        while True:
+            items = self._take()
+            if not items:
+                return
+            try:
+                self.send(items if self.batch > 1 else items[0])
+                self.sent += len(items)
+                failures = 0
+            except Exception as e:
+                self.errors += 1
+                self.dropped += len(items)
+                failures += 1
+                print("ingest: %s sink failed: %s" % (self.name, e), file=sys.stderr)
+                delay = min(self.min_backoff * 2 ** (failures - 1), self.max_backoff)
+                with self._cond:
+                    if not self._closing:
+                        self._cond.wait(delay)
+
+    def close(self, timeout=10):
+        """
+        Stop after draining what is queued (bounded by `timeout`).
+        """
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        if self.on_close is not None:
+            self.on_close()
+
+
+def http_post(url, body, timeout=5):
+    request = urllib.request.Request(
+        url, data=body, headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+def jsonl_sink(directory, prefix="weather_"):
+    logger = BufferedJsonlLogger(directory, prefix, batch_lines=100,
+                                 batch_seconds=2, fsync=FSYNC_INTERVAL)
+    # Local disk keeps up, so give it room for a whole replayed capture
+    return SinkWorker("jsonl", logger.log, maxsize=100000, on_close=logger.close)
+
+
+def flask_sink(base_url, batch=FLASK_BATCH):
+    url = base_url.rstrip("/") + "/api/data/batch"
+    return SinkWorker("flask", lambda items: http_post(url, json.dumps(items).encode()),
+                      batch=batch)
+
+
+def nodered_sink(url):
+    return SinkWorker("nodered", lambda record: http_post(url, json.dumps(record).encode()))
+
+
+# -----------------------------
+# Daemon
+# -----------------------------
+class Ingestor:
+    """
+    The reader loop runs in the calling thread and only moves chunks;
+    parsing, tracking and fan-out happen in the parser thread.
+    """
+
+    def __init__(self, source, sinks, parser=None, tracker=None,
+                 queue_chunks=1024):
+        self.source = source
+        self.sinks = sinks
+        self.parser = parser or LineParser()
+        self.tracker = tracker or SequenceTracker()
+
+        self.bytes_read = 0
+        self.chunks_dropped = 0
+        self.events = collections.deque(maxlen=100)
+
+        self._chunks = collections.deque(maxlen=queue_chunks)
+        self._cond = threading.Condition()
+        self._done = False
+        self._stop = threading.Event()
+        self._parse_thread = threading.Thread(target=self._parse_loop,
+                                              name="parser", daemon=True)
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, poll=0.5, stats_every=60):
+        for sink in self.sinks:
+            sink.start()
+        self._parse_thread.start()
+
+        next_stats = time.monotonic() + stats_every if stats_every else None
+        try:
+            while not self._stop.is_set():
+                chunk = self.source.read(poll)
+                if chunk is None:
+                    break
+                if chunk:
+                    self.bytes_read += len(chunk)
+                    with self._cond:
+                        if len(self._chunks) == self._chunks.maxlen:
+                            self.chunks_dropped += 1
+                        self._chunks.append((time.time(), chunk))
+                        self._cond.notify()
+                if next_stats is not None and time.monotonic() >= next_stats:
+                    print(json.dumps(self.report()), file=sys.stderr)
+                    next_stats += stats_every
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify()
+            self._parse_thread.join()
+            for sink in self.sinks:
+                sink.close()
+            self.source.close()
+        return self.report()
+
+    def _parse_loop(self):
+        while True:
+            with self._cond:
+                while not self._chunks and not self._done:
+                    self._cond.wait()
+                if not self._chunks:
+                    return
+                chunks = list(self._chunks)
+                self._chunks.clear()
+            for read_at, chunk in chunks:
+                self._handle(chunk, read_at)
+
+    def _handle(self, chunk, read_at):
+        records = self.parser.feed(chunk)
+        for text in self.parser.take_banners():
+            self.tracker.banner(text)
+            self.events.append(("banner", text))
+        for seq, record in records:
+            event = self.tracker.observe(seq, record.get("timestamp"))
+            if event is not None:
+                self.events.append((event, record.get("timestamp")))
+            # Wall-clock read time, so batched uploads keep real spacing
+            record["received_at"] = read_at
+            for sink in self.sinks:
+                sink.put(record)
+
+    def report(self):
+        tracker = self.tracker
+        report = {
+            "bytes": self.bytes_read,
+            "records": tracker.records,
+            "reboots": tracker.reboots,
+            "gaps": tracker.gaps,
+            "missed": tracker.missed,
+            "chunks_dropped": self.chunks_dropped,
+            "sinks": {
+                sink.name: {"sent": sink.sent, "dropped": sink.dropped,
+                            "errors": sink.errors, "pending": sink.pending()}
+                for sink in self.sinks
+            }
+        }
+        parser = self.parser
+        if isinstance(parser, LineParser):
+            report.update(lines=parser.lines, garbled=parser.garbled,
+                          waiting_for_keyframe=parser.waiting)
+        else:
+            decoder = parser.decoder
+            report.update(frames=decoder.frames, crc_errors=decoder.crc_errors,
+                          skipped_bytes=decoder.skipped_bytes)
+        return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("source", help="serial port, pty, FIFO or capture file")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--format", choices=("json", "binary"), default="json")
+    parser.add_argument("--follow", action="store_true",
+                        help="keep reading a regular file as it grows")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL,
+                        help="expected seconds between samples, for gap detection")
+    parser.add_argument("--jsonl", metavar="DIR", help="write daily JSONL files here")
+    parser.add_argument("--flask", metavar="URL", help="Flask receiver base URL")
+    parser.add_argument("--nodered", metavar="URL", help="Node-RED HTTP endpoint")
+    parser.add_argument("--stats-every", type=float, default=60,
+                        help="seconds between stats lines on stderr, 0 = off")
+    args = parser.parse_args(argv)
+
+    sinks = []
+    if args.jsonl:
+        os.makedirs(args.jsonl, exist_ok=True)
+        sinks.append(jsonl_sink(args.jsonl))
+    if args.flask:
+        sinks.append(flask_sink(args.flask))
+    if args.nodered:
+        sinks.append(nodered_sink(args.nodered))
+
+    ingestor = Ingestor(
+        open_source(args.source, args.baud, args.follow), sinks,
+        FrameParser() if args.format == "binary" else LineParser(),
+        SequenceTracker(args.interval)
+    )
+    try:
+        report = ingestor.run(stats_every=args.stats_every)
+    except KeyboardInterrupt:
+        ingestor.stop()
+        report = ingestor.report()
+    print(json.dumps(report), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,90 @@
+from array import array
+
+REDUCE_MEAN = "mean"
+REDUCE_TRIMMED_MEAN = "trimmed_mean"
+REDUCE_MEDIAN = "median"
+REDUCE_IIR = "iir"
+
+def _insertion_sort(buf):
+    # In place, no allocation; bursts are only a few dozen samples
+    for i in range(1, len(buf)):
+        v = buf[i]
+        j = i - 1
+        while j >= 0 and buf[j] > v:
+            buf[j + 1] = buf[j]
+            j -= 1
+        buf[j + 1] = v
+
 class LightSensor:
-    def __init__(self, adc):
+    """
+    LDR on an ADC channel.
+
+    With oversample > 1 each read captures a burst of ADC counts into a
+    preallocated array('H') and reduces it with a trimmed mean,
+    median-of-K, plain mean or an IIR filter before the lux conversion.
+    The variance of the last burst (in raw counts) is kept in
+    raw_variance.
+    """
+
+    def __init__(self, adc, oversample=1, reducer=REDUCE_MEAN,
+                 trim=None, alpha=0.2):
+        if reducer not in (REDUCE_MEAN, REDUCE_TRIMMED_MEAN,
+                           REDUCE_MEDIAN, REDUCE_IIR):
+            raise ValueError("unknown reducer: %s" % reducer)
+        if oversample < 1:
+            raise ValueError("oversample must be at least 1")
         self.adc = adc
+        self.oversample = oversample
+        self.reducer = reducer
+        self.trim = oversample // 4 if trim is None else trim
+        self.alpha = alpha
+        self.raw_variance = 0.0
+
+        self._burst = array("H", [0] * oversample)
+        self._iir = None
+
+    def read_raw(self):
+        """
+        Return the reduced ADC count for one burst.
+        """
+        buf = self._burst
+        n = self.oversample
+        read = self.adc.read
+
+        total = 0
+        total_sq = 0
+        for i in range(n):
+            v = read()
+            buf[i] = v
+            total += v
+            total_sq += v * v
+
+        mean = total / n
+        self.raw_variance = max(total_sq / n - mean * mean, 0.0)
+
+        if self.reducer == REDUCE_MEAN:
+            return mean
+
+        if self.reducer == REDUCE_IIR:
+            y = buf[0] if self._iir is None else self._iir
+            for i in range(n):
+                y += self.alpha * (buf[i] - y)
+            self._iir = y
+            return y
+
+        _insertion_sort(buf)
+        if self.reducer == REDUCE_MEDIAN:
+            mid = n // 2
+            return buf[mid] if n % 2 else (buf[mid - 1] + buf[mid]) / 2
+
+        trim = self.trim if 2 * self.trim < n else (n - 1) // 2
+        kept = 0
+        for i in range(trim, n - trim):
+            kept += buf[i]
+        return kept / (n - 2 * trim)
 
     def read_lux(self):
-        return round((self.adc.read() / 4095) * 1000, 1)
+        # Single plain reads skip the burst; IIR keeps state across reads
+        if self.oversample == 1 and self.reducer == REDUCE_MEAN:
+            return round((self.adc.read() / 4095) * 1000, 1)
+        return round((self.read_raw() / 4095) * 1000, 1)
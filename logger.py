@@ -1,7 +1,12 @@
 import json
+import os
 import time
 from config import SD_MOUNT_POINT
 
+FSYNC_EVERY_BATCH = "batch"
+FSYNC_INTERVAL = "interval"
+FSYNC_ON_SHUTDOWN = "shutdown"
+
 def get_log_filename():
     date = time.strftime("%Y-%m-%d", time.localtime())
     return f"{SD_MOUNT_POINT}/weather_{date}.jsonl"
@@ -9,3 +14,138 @@ def get_log_filename():
 def log(payload):
     with open(get_log_filename(), "a") as f:
         f.write(json.dumps(payload) + "\n")
+
+
+def _fsync(f):
+    f.flush()
+    # MicroPython has no os.fsync; flush() already syncs the FAT file there
+    sync = getattr(os, "fsync", None)
+    if sync is not None:
+        sync(f.fileno())
+
+
+class BufferedJsonlLogger:
+    """
+    Daily JSONL log that keeps its file open and writes in batches.
+
+    Lines are buffered until `batch_lines` are pending or
+    `batch_seconds` have passed, then written with a single write().
+    The file rotates when the local date changes. `fsync` selects when
+    data is forced to storage: after every batch, every
+    `fsync_interval` seconds, or only on flush()/close().
+    """
+
+    def __init__(self, directory=SD_MOUNT_POINT, prefix="weather_",
+                 batch_lines=20, batch_seconds=5,
+                 fsync=FSYNC_INTERVAL, fsync_interval=30,
+                 clock=time.time):
+        if fsync not in (FSYNC_EVERY_BATCH, FSYNC_INTERVAL, FSYNC_ON_SHUTDOWN):
+            raise ValueError("unknown fsync policy: %s" % fsync)
+        self.directory = directory
+        self.prefix = prefix
+        self.batch_lines = batch_lines
+        self.batch_seconds = batch_seconds
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.clock = clock
+
+        self._pending = []
+        self._file = None
+        self._filename = None
+        self._day_end = 0
+        self._last_write = clock()
+        self._last_sync = self._last_write
+
+    def filename_for(self, now):
+        t = time.localtime(int(now))
+        return "%s/%s%04d-%02d-%02d.jsonl" % (
+            self.directory, self.prefix, t[0], t[1], t[2]
+        )
+
+    def _rotate(self, now):
+        # Only called once per day; every other write compares one number
+        self._flush_pending()
+        self._close_file()
+
+        t = time.localtime(int(now))
+        self._day_end = int(now) - (t[3] * 3600 + t[4] * 60 + t[5]) + 86400
+        self._filename = self.filename_for(now)
+
+    def log(self, payload):
+        self.write_line(json.dumps(payload))
+
+    def write_line(self, line, now=None):
+        """
+        Queue one already-serialised JSON line.
+        """
+        if now is None:
+            now = self.clock()
+        if now >= self._day_end:
+            self._rotate(now)
+
+        self._pending.append(line if line.endswith("\n") else line + "\n")
+
+        if (len(self._pending) >= self.batch_lines
+                or now - self._last_write >= self.batch_seconds):
+            self._write_batch(now)
+
+    def _flush_pending(self):
+        if not self._pending:
+            return False
+        if self._file is None:
+            self._file = open(self._filename, "a")
+        self._file.write("".join(self._pending))
+        self._pending = []
+        return True
+
+    def _write_batch(self, now):
+        self._flush_pending()
+        self._last_write = now
+
+        if self.fsync == FSYNC_EVERY_BATCH or (
+            self.fsync == FSYNC_INTERVAL
+            and now - self._last_sync >= self.fsync_interval
+        ):
+            self._sync(now)
+
+    def _sync(self, now):
+        if self._file is not None:
+            _fsync(self._file)
+        self._last_sync = now
+
+    def flush(self):
+        """
+        Write all pending lines and force them to storage.
+        """
+        self._flush_pending()
+        now = self.clock()
+        self._last_write = now
+        self._sync(now)
+
+    def _close_file(self):
+        if self._file is not None:
+            _fsync(self._file)
+            self._file.close()
+            self._file = None
+
+    def reopen(self):
+        """
+        Drop the file handle, e.g. after the card was remounted.
+        Pending lines are kept and written to a fresh handle.
+        """
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def close(self):
+        self._flush_pending()
+        self._close_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
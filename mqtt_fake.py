@@ -0,0 +1,243 @@
+"""
+mqtt_fake.py
+Local MQTT 3.1.1 broker stand-in (host only).
+
+    broker = FakeBroker()
+    broker.start()
+    sink = MQTTSink(default_client_factory("station", *broker.address))
+"""
+
+import socket
+import socketserver
+import struct
+import threading
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+def topic_matches(pattern, topic):
+    """
+    MQTT filter matching with `+` (one level) and `#` (the rest).
+    """
+    want = pattern.split("/")
+    have = topic.split("/")
+    for i, part in enumerate(want):
+        if part == "#":
+            return True
+        if i >= len(have) or (part != "+" and part != have[i]):
+            return False
+    return len(want) == len(have)
+
+
+def _read_exactly(sock, n):
+    data = b""
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("client went away")
+        data += chunk
+    return data
+
+
+def _read_packet(sock):
+    first = _read_exactly(sock, 1)[0]
+    length = 0
+    shift = 0
+    while True:
+        byte = _read_exactly(sock, 1)[0]
+        length |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return first >> 4, first & 0x0F, _read_exactly(sock, length)
+
+
+def _packet(kind, flags, body):
+    out = bytearray([(kind << 4) | flags])
+    length = len(body)
+    while True:
+        byte = length & 0x7F
+        length >>= 7
+        out.append(byte | 0x80 if length else byte)
+        if not length:
+            break
+    return bytes(out) + body
+
+
+def _string(data, pos):
+    (n,) = struct.unpack_from("!H", data, pos)
+    return data[pos + 2:pos + 2 + n], pos + 2 + n
+
+
+def _publish_packet(topic, payload, qos, retain, packet_id=1):
+    body = struct.pack("!H", len(topic)) + topic.encode()
+    if qos:
+        body += struct.pack("!H", packet_id)
+    return _packet(PUBLISH, (qos << 1) | int(retain), body + payload)
+
+
+class FakeBroker:
+    """
+    Accepts CONNECT, PUBLISH (QoS 0/1), SUBSCRIBE, PINGREQ and
+    DISCONNECT, keeps retained messages and fires last wills when a
+    client drops without DISCONNECT.
+
+    `messages` records every (topic, payload, qos, retain) published.
+    Set `online = False` to refuse new connections, and call
+    drop_clients() to cut the existing ones, to simulate an outage.
+    """
+
+    def __init__(self, port=0):
+        self.online = True
+        self.messages = []
+        self.retained = {}
+        self.connections = 0
+        self.client_ids = []
+
+        self._lock = threading.Lock()
+        self._clients = set()
+        self._subscriptions = {}
+
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                broker._serve(self.request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.drop_clients()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def drop_clients(self):
+        with self._lock:
+            clients = list(self._clients)
+        for sock in clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def topics(self, pattern="#"):
+        """
+        Payloads published on topics matching `pattern`, in order.
+        """
+        return [m[1] for m in self.messages if topic_matches(pattern, m[0])]
+
+    def _serve(self, sock):
+        if not self.online:
+            sock.close()
+            return
+        will = None
+        clean = False
+        with self._lock:
+            self._clients.add(sock)
+        try:
+            kind, _, body = _read_packet(sock)
+            if kind != CONNECT:
+                return
+            will = self._connect(body)
+            sock.sendall(_packet(CONNACK, 0, b"\x00\x00"))
+
+            while True:
+                kind, flags, body = _read_packet(sock)
+                if kind == PUBLISH:
+                    self._publish(sock, flags, body)
+                elif kind == SUBSCRIBE:
+                    self._subscribe(sock, body)
+                elif kind == PINGREQ:
+                    sock.sendall(_packet(PINGRESP, 0, b""))
+                elif kind == DISCONNECT:
+                    clean = True
+                    return
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._clients.discard(sock)
+                self._subscriptions.pop(sock, None)
+            sock.close()
+            if will is not None and not clean:
+                self._deliver(*will)
+
+    def _connect(self, body):
+        _, pos = _string(body, 0)
+        flags = body[pos + 1]
+        pos += 4
+        client_id, pos = _string(body, pos)
+        with self._lock:
+            self.connections += 1
+            self.client_ids.append(client_id.decode())
+        if flags & 0x04:
+            topic, pos = _string(body, pos)
+            message, pos = _string(body, pos)
+            return topic.decode(), message, (flags >> 3) & 0x03, bool(flags & 0x20)
+        return None
+
+    def _publish(self, sock, flags, body):
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+        topic, pos = _string(body, 0)
+        if qos:
+            (packet_id,) = struct.unpack_from("!H", body, pos)
+            pos += 2
+        self._deliver(topic.decode(), body[pos:], qos, retain)
+        if qos:
+            sock.sendall(_packet(PUBACK, 0, struct.pack("!H", packet_id)))
+
+    def _deliver(self, topic, payload, qos, retain):
+        with self._lock:
+            self.messages.append((topic, payload, qos, retain))
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            targets = [s for s, patterns in self._subscriptions.items()
+                       if any(topic_matches(p, topic) for p in patterns)]
+        for target in targets:
+            try:
+                target.sendall(_publish_packet(topic, payload, 0, False))
+            except OSError:
+                pass
+
+    def _subscribe(self, sock, body):
+        (packet_id,) = struct.unpack_from("!H", body, 0)
+        pos = 2
+        patterns = []
+        granted = bytearray()
+        while pos < len(body):
+            pattern, pos = _string(body, pos)
+            granted.append(min(body[pos], 1))
+            pos += 1
+            patterns.append(pattern.decode())
+        with self._lock:
+            self._subscriptions.setdefault(sock, []).extend(patterns)
+            retained = [(t, p) for t, p in self.retained.items()
+                        if any(topic_matches(pat, t) for pat in patterns)]
+        sock.sendall(_packet(SUBACK, 0, struct.pack("!H", packet_id) + bytes(granted)))
+        for topic, payload in retained:
+            sock.sendall(_publish_packet(topic, payload, 0, True))
@@ -0,0 +1,358 @@
+"""
+mqtt_sink.py
+MQTT publishing sink (umqtt on the ESP32, paho on the host)
+
+Topics, per station:
+
+    <prefix>/<station>/samples   one payload, or a JSON array when batching
+    <prefix>/<station>/latest    newest payload, retained
+    <prefix>/<station>/status    "online" / "offline" (last will), retained
+
+Batches that cannot be published go to an Outbox file on flash and are
+drained, oldest first, after the next successful connect, so an outage
+or a reboot loses nothing until the outbox fills up.
+"""
+
+import json
+import os
+import sys
+import time
+
+from config import (MQTT_BROKER, MQTT_PORT, MQTT_QOS, MQTT_BATCH,
+                    MQTT_PREFIX, MQTT_OUTBOX, STATION_ID)
+
+
+class Outbox:
+    """
+    Append-only file of pending messages, one "topic<TAB>body" per line,
+    plus a small `<path>.pos` file holding the offset of the first
+    unsent line. When the file grows past `max_bytes` the oldest half
+    of the backlog is dropped. The offset is saved once per drain pass,
+    so a reboot mid-pass re-sends at most that pass.
+    """
+
+    def __init__(self, path=MQTT_OUTBOX, max_bytes=256 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._pos = self._load_pos()
+        self._size = self._file_size()
+        if self._pos > self._size:
+            self._pos = 0
+        self._saved = self._pos
+
+    def _file_size(self):
+        try:
+            return os.stat(self.path)[6]
+        except OSError:
+            return 0
+
+    def _load_pos(self):
+        try:
+            with open(self.path + ".pos") as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _save_pos(self):
+        with open(self.path + ".pos", "w") as f:
+            f.write(str(self._pos))
+        self._saved = self._pos
+
+    def __len__(self):
+        # Pending bytes; zero means empty
+        return self._size - self._pos
+
+    def append(self, topic, body):
+        line = ("%s\t%s\n" % (topic, body)).encode()
+        if self._size + len(line) > self.max_bytes:
+            self._compact(drop_half=True)
+        with open(self.path, "ab") as f:
+            f.write(line)
+        self._size += len(line)
+
+    def peek(self):
+        """
+        Return (topic, body) of the oldest pending message, or None.
+        """
+        if not len(self):
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(self._pos)
+            line = f.readline()
+        self._next = self._pos + len(line)
+        topic, _, body = line.decode().rstrip("\n").partition("\t")
+        return topic, body
+
+    def ack(self):
+        """
+        Mark the message returned by peek() as sent. The position is
+        only written to flash by save(), once per drain pass.
+        """
+        self._pos = self._next
+        if self._pos >= self._size:
+            self.clear()
+
+    def save(self):
+        """
+        Persist the read position (after a run of ack() calls).
+        """
+        if self._pos != self._saved:
+            self._save_pos()
+
+    def clear(self):
+        for path in (self.path, self.path + ".pos"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._pos = 0
+        self._size = 0
+        self._saved = 0
+
+    def _compact(self, drop_half=False):
+        # Stream-copy from the first kept line; a 256 KiB backlog does
+        # not fit in the ESP32 heap as a list of lines
+        start = self._pos
+        if drop_half and len(self):
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                count = 0
+                while f.readline():
+                    count += 1
+                drop = max(count // 2, 1)
+                f.seek(start)
+                for _ in range(drop):
+                    start += len(f.readline())
+            self.dropped += drop
+
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as out:
+            if start < self._size:
+                with open(self.path, "rb") as f:
+                    f.seek(start)
+                    buf = bytearray(512)
+                    while True:
+                        n = f.readinto(buf)
+                        if not n:
+                            break
+                        out.write(buf if n == len(buf) else memoryview(buf)[:n])
+        os.rename(tmp, self.path)
+        self._pos = 0
+        self._size = self._file_size()
+        self._save_pos()
+
+
+class PahoClient:
+    """
+    paho-mqtt behind the small umqtt.simple interface the sink uses.
+    QoS 1 publishes wait for the PUBACK, like umqtt does.
+    """
+
+    def __init__(self, client_id, server, port=1883, keepalive=60, timeout=5):
+        import paho.mqtt.client as mqtt
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            self._client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2,
+                                       client_id=client_id)
+        else:
+            self._client = mqtt.Client(client_id=client_id)
+        self.server = server
+        self.port = port
+        self.keepalive = keepalive
+        self.timeout = timeout
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        self._client.will_set(topic, msg, qos, retain)
+
+    def connect(self):
+        self._client.connect(self.server, self.port, self.keepalive)
+        self._client.loop_start()
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        info = self._client.publish(topic, msg, qos, retain)
+        if info.rc != 0:
+            raise OSError("publish failed (rc %d)" % info.rc)
+        if qos:
+            info.wait_for_publish(self.timeout)
+            if not info.is_published():
+                raise OSError("no PUBACK within %ss" % self.timeout)
+
+    def disconnect(self):
+        try:
+            self._client.disconnect()
+        finally:
+            self._client.loop_stop()
+
+
+def default_client_factory(station=STATION_ID, server=MQTT_BROKER,
+                           port=MQTT_PORT, keepalive=60):
+    def factory():
+        if sys.implementation.name == "micropython":
+            from umqtt.simple import MQTTClient  # type: ignore
+            return MQTTClient(station, server, port, keepalive=keepalive)
+        return PahoClient(station, server, port, keepalive)
+    return factory
+
+
+class MQTTSink:
+    """
+    send() adds a payload to the current batch and publishes it once
+    `batch` payloads are collected. The connection is opened lazily and
+    reopened with exponential backoff after a failure; meanwhile
+    batches go to the outbox. Every successful send also drains up to
+    `drain_per_send` outbox messages so a long backlog never blocks the
+    sampler for long. The retained `latest` message is refreshed once
+    per published batch.
+    """
+
+    def __init__(self, client_factory=None, station=STATION_ID,
+                 prefix=MQTT_PREFIX, qos=MQTT_QOS, batch=MQTT_BATCH,
+                 retain_latest=True, outbox=None, drain_per_send=5,
+                 min_backoff=1, max_backoff=120, clock=time.time):
+        if qos not in (0, 1):
+            raise ValueError("qos must be 0 or 1")
+        self.client_factory = client_factory or default_client_factory(station)
+        self.qos = qos
+        self.batch = max(batch, 1)
+        self.retain_latest = retain_latest
+        self.outbox = outbox if outbox is not None else Outbox()
+        self.drain_per_send = drain_per_send
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+
+        base = "%s/%s/" % (prefix, station)
+        self.samples_topic = base + "samples"
+        self.latest_topic = base + "latest"
+        self.status_topic = base + "status"
+
+        self.published = 0
+        self.queued = 0
+        self.drained = 0
+        self.failures = 0
+        self.last_error = None
+
+        self._client = None
+        self._next_attempt = 0
+        self._pending = []
+        self._latest = None
+
+    @property
+    def connected(self):
+        return self._client is not None
+
+    def _connect(self, now):
+        if self._client is not None:
+            return True
+        if now < self._next_attempt:
+            return False
+        client = None
+        try:
+            client = self.client_factory()
+            client.set_last_will(self.status_topic, "offline", True, 1)
+            client.connect()
+            client.publish(self.status_topic, "online", True, 1)
+        except Exception as e:
+            if client is not None:
+                self._close(client)
+            self._back_off(now, e)
+            return False
+        self._client = client
+        return True
+
+    @staticmethod
+    def _close(client):
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+
+    def _back_off(self, now, error):
+        self.failures += 1
+        self.last_error = error
+        delay = self.min_backoff * (2 ** (self.failures - 1))
+        self._next_attempt = now + min(delay, self.max_backoff)
+
+    def _publish(self, topic, body, retain=False):
+        try:
+            self._client.publish(topic, body, retain, self.qos)
+        except Exception as e:
+            self._close(self._client)
+            self._client = None
+            self._back_off(self.clock(), e)
+            return False
+        self.failures = 0
+        self.last_error = None
+        return True
+
+    def send(self, payload):
+        self._pending.append(payload)
+        self._latest = payload
+        if len(self._pending) >= self.batch:
+            self.flush()
+        else:
+            self._drain()
+
+    def flush(self):
+        """
+        Publish the current (possibly partial) batch, or park it in the
+        outbox when that is not possible.
+        """
+        if self._pending:
+            pending = self._pending
+            self._pending = []
+            body = json.dumps(pending[0] if len(pending) == 1 else pending)
+            # Older batches in the outbox go first to keep the order
+            if not (self._drain() and not len(self.outbox)
+                    and self._publish(self.samples_topic, body)):
+                self.outbox.append(self.samples_topic, body)
+                self.queued += len(pending)
+            else:
+                self.published += len(pending)
+
+        if self._latest is not None and self.retain_latest and self._client is not None:
+            if self._publish(self.latest_topic, json.dumps(self._latest), True):
+                self._latest = None
+
+    def _drain(self):
+        """
+        Publish up to `drain_per_send` outbox messages. Returns False
+        when there is no connection.
+        """
+        if not self._connect(self.clock()):
+            return False
+        ok = True
+        for _ in range(self.drain_per_send):
+            message = self.outbox.peek()
+            if message is None:
+                break
+            if not self._publish(*message):
+                ok = False
+                break
+            self.outbox.ack()
+            self.drained += 1
+        self.outbox.save()
+        return ok
+
+    def close(self):
+        self.flush()
+        if self._client is not None:
+            try:
+                self._client.publish(self.status_topic, "offline", True, 1)
+            except Exception:
+                pass
+            self._close(self._client)
+            self._client = None
+
+
+_sink = None
+
+
+def send(payload: dict):
+    """
+    Publish through a shared MQTTSink configured from config.py.
+    """
+    global _sink
+    if _sink is None:
+        _sink = MQTTSink()
+    _sink.send(payload)
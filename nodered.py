@@ -1,18 +1,298 @@
-import urequests
+import json
+import sys
+import time
+
+from config import NODE_RED_URL
+
+
+def split_url(url):
+    """
+    "http://host:port/path" -> (host, port, path). Only plain HTTP:
+    Node-RED sits on the local network.
+    """
+    scheme, _, rest = url.partition("://")
+    if scheme != "http":
+        raise ValueError("only http:// URLs are supported: %s" % url)
+    hostport, slash, path = rest.partition("/")
+    host, _, port = hostport.partition(":")
+    return host, int(port) if port else 80, slash + path or "/"
+
+
+class RawHTTPConnection:
+    """
+    Minimal HTTP/1.1 keep-alive client on a raw socket, for MicroPython
+    where urequests opens and closes a connection per request. The
+    socket is opened on first use and reused until the server closes it
+    or a request fails.
+    """
+
+    def __init__(self, url, timeout=5):
+        self.host, self.port, self.path = split_url(url)
+        self.timeout = timeout
+        self.connects = 0
+        # False while a failed post() never got its request onto the wire
+        self.request_sent = False
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        import socket
+        addr = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0][-1]
+        sock = socket.socket()
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(addr)
+        except Exception:
+            sock.close()
+            raise
+        self._sock = sock
+        self._file = sock.makefile("rb")
+        self.connects += 1
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            except Exception:
+                pass
+        self._sock = None
+        self._file = None
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def post(self, body):
+        """
+        POST `body` (bytes) as JSON and return the status code.
+        """
+        self.request_sent = False
+        if self._sock is None:
+            self._connect()
+        head = (
+            "POST %s HTTP/1.1\r\n"
+            "Host: %s:%d\r\n"
+            "Content-Type: application/json\r\n"
+            "Content-Length: %d\r\n"
+            "Connection: keep-alive\r\n\r\n"
+            % (self.path, self.host, self.port, len(body))
+        ).encode()
+        try:
+            self._write(head)
+            self._write(body)
+            self.request_sent = True
+            return self._read_response()
+        except Exception:
+            self.close()
+            raise
+
+    def _write(self, data):
+        write = getattr(self._sock, "sendall", None) or self._sock.write
+        write(data)
+
+    def _read_response(self):
+        line = self._file.readline()
+        if not line:
+            # The server dropped an idle keep-alive connection
+            raise OSError("connection closed by server")
+        status = int(line.split(None, 2)[1])
+
+        length = 0
+        chunked = False
+        keep_alive = True
+        while True:
+            line = self._file.readline()
+            if not line or line == b"\r\n":
+                break
+            name, _, value = line.decode().partition(":")
+            name = name.strip().lower()
+            value = value.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "transfer-encoding" and value == "chunked":
+                chunked = True
+            elif name == "connection" and value == "close":
+                keep_alive = False
+
+        # The body has to be consumed before the socket can be reused
+        if chunked:
+            while True:
+                size = int(self._file.readline().split(b";")[0], 16)
+                self._read_exactly(size + 2)
+                if size == 0:
+                    break
+        elif length:
+            self._read_exactly(length)
+
+        if not keep_alive:
+            self.close()
+        return status
+
+    def _read_exactly(self, n):
+        while n > 0:
+            chunk = self._file.read(min(n, 512))
+            if not chunk:
+                raise OSError("connection closed mid-response")
+            n -= len(chunk)
+
+
+class SessionConnection:
+    """
+    Host-side equivalent on a requests.Session (via the urequests.py
+    shim), which pools and reuses connections itself.
+    """
+
+    def __init__(self, url, timeout=5):
+        import urequests
+        self.url = url
+        self.timeout = timeout
+        self.connects = 0
+        # requests cannot tell how far a failed request got
+        self.request_sent = True
+        self._session = None
+        self._session_factory = urequests.Session
+
+    @property
+    def connected(self):
+        return self._session is not None
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+        self._session = None
+
+    def post(self, body):
+        if self._session is None:
+            self._session = self._session_factory()
+            self.connects += 1
+        try:
+            r = self._session.post(
+                self.url, data=body, timeout=self.timeout,
+                headers={"Content-Type": "application/json"}
+            )
+        except Exception:
+            self.close()
+            raise
+        r.close()
+        return r.status_code
+
+
+def default_connection(url, timeout=5):
+    if sys.implementation.name == "micropython":
+        return RawHTTPConnection(url, timeout)
+    return SessionConnection(url, timeout)
+
+
+class NodeRedSender:
+    """
+    Buffered, keep-alive sender.
+
+    send() queues the payload and flushes. Every payload is POSTed as
+    one JSON object on the same connection, live or from the backlog,
+    so the flow only ever sees one shape. During an outage payloads
+    wait in a bounded buffer (oldest dropped first) and reconnects back
+    off exponentially; once the link returns the backlog drains oldest
+    first. A 4xx answer drops that payload instead of retrying it.
+    """
+
+    def __init__(self, url=NODE_RED_URL, maxsize=256,
+                 min_backoff=1, max_backoff=60, timeout=5,
+                 connection=None, clock=time.time):
+        self.url = url
+        self.maxsize = maxsize
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.connection = connection or default_connection(url, timeout)
+
+        self.sent = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failures = 0
+        self.last_error = None
+
+        self._buffer = []
+        self._next_attempt = 0
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def send(self, payload):
+        if len(self._buffer) >= self.maxsize:
+            self._buffer.pop(0)
+            self.dropped += 1
+        self._buffer.append(payload)
+        self.flush()
+
+    def _post(self, payload):
+        body = json.dumps(payload).encode()
+        was_connected = self.connection.connected
+        try:
+            return self.connection.post(body)
+        except OSError:
+            if not was_connected or self.connection.request_sent:
+                raise
+            # A reused keep-alive socket may have been closed while idle:
+            # retry once on a fresh connection before calling it an
+            # outage. Only when the request never went out, or Node-RED
+            # could receive the same sample twice.
+            return self.connection.post(body)
+
+    def flush(self, now=None):
+        """
+        Send as much of the buffer as possible. Returns the number of
+        payloads delivered.
+        """
+        if now is None:
+            now = self.clock()
+        if now < self._next_attempt:
+            return 0
+
+        delivered = 0
+        while self._buffer:
+            try:
+                status = self._post(self._buffer[0])
+            except Exception as e:
+                self._back_off(now, e)
+                return delivered
+            if status >= 500:
+                # Server trouble: keep the payload for the next attempt
+                self._back_off(now, "HTTP %d" % status)
+                return delivered
+
+            self._buffer.pop(0)
+            self.failures = 0
+            self.last_error = None
+            if status >= 400:
+                self.rejected += 1
+            else:
+                self.sent += 1
+                delivered += 1
+        return delivered
+
+    def _back_off(self, now, error):
+        self.failures += 1
+        self.last_error = error
+        delay = self.min_backoff * (2 ** (self.failures - 1))
+        self._next_attempt = now + min(delay, self.max_backoff)
+
+    def close(self):
+        self.connection.close()
+
+
+_sender = None
 
-NODE_RED_URL = "http://NODE_RED_IP:1880/ui"
 
 def send(payload: dict):
     """
-    Send payload to Node-RED via HTTP POST.
-    Fail silently to avoid disrupting the main loop.
+    Send payload to Node-RED over a shared keep-alive connection.
+    Never raises: failed payloads stay buffered for the next call.
     """
+    global _sender
     try:
-        r = urequests.post(
-            NODE_RED_URL,
-            json=payload,
-            headers={"Content-Type": "application/json"}
-        )
-        r.close()
+        if _sender is None:
+            _sender = NodeRedSender()
+        _sender.send(payload)
     except Exception:
         pass
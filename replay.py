@@ -0,0 +1,222 @@
+"""
+replay.py
+Replay JSONL captures through the on-device analysis (host side)
+
+Streams a capture lazily, feeds local.light_lux and
+local.temperature_c back through the statistics.py functions and
+time_of_day_from_trend, and hands the re-analysed payloads to any
+number of sinks. Pacing follows the recorded timestamps at wall-clock
+speed, N times faster, or as fast as possible (--speed 0).
+
+    python replay.py esp32_weather.jsonl --speed 0 --day-threshold 150
+    python replay.py esp32_weather.jsonl --speed 10 --out replayed.jsonl
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from config import DAY_THRESHOLD, NIGHT_THRESHOLD, TREND_EPSILON, LUX_HISTORY_SIZE
+from day_night import time_of_day_from_trend
+from ring_buffer import RingBuffer
+from statistics import mean, median, min_max_range, moving_average, std_dev
+
+
+def read_jsonl(path):
+    """
+    Yield one dict per JSON line. Banners and garbled lines are skipped.
+    """
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith("{"):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                yield record
+
+
+class Analyser:
+    """
+    Host copy of the device's per-sample analysis with tunable
+    thresholds.
+    """
+
+    def __init__(self, window=LUX_HISTORY_SIZE, day_threshold=DAY_THRESHOLD,
+                 night_threshold=NIGHT_THRESHOLD, epsilon=TREND_EPSILON,
+                 moving_window=10):
+        self.day_threshold = day_threshold
+        self.night_threshold = night_threshold
+        self.epsilon = epsilon
+        self.moving_window = moving_window
+
+        self.lux_history = RingBuffer(window, "d")
+        self.temp_history = RingBuffer(window, "d")
+        self.state = "Unknown"
+
+    def reset(self):
+        """
+        Forget the histories and day/night state, as a device reboot does.
+        """
+        self.lux_history.clear()
+        self.temp_history.clear()
+        self.state = "Unknown"
+
+    def analyse(self, record):
+        """
+        Return a copy of `record` with time_of_day and stats recomputed,
+        or None if it carries no light reading.
+        """
+        local = record.get("local") or {}
+        lux = local.get("light_lux")
+        if lux is None:
+            return None
+        temp = local.get("temperature_c")
+
+        self.lux_history.append(lux)
+        if temp is not None:
+            self.temp_history.append(temp)
+
+        new_state = time_of_day_from_trend(
+            self.lux_history, self.day_threshold,
+            self.night_threshold, self.epsilon
+        )
+        if new_state in ("Day", "Night"):
+            self.state = new_state
+
+        lux_min, lux_max, lux_rng = min_max_range(self.lux_history)
+        temp_min, temp_max, temp_rng = min_max_range(self.temp_history)
+
+        payload = dict(record)
+        payload["local"] = dict(local, time_of_day=self.state)
+        payload["stats"] = {
+            "lux_mean": mean(self.lux_history),
+            "lux_median": median(self.lux_history),
+            "lux_min": lux_min,
+            "lux_max": lux_max,
+            "lux_range": lux_rng,
+            "lux_std": std_dev(self.lux_history),
+            "lux_moving_avg": moving_average(self.lux_history, self.moving_window),
+            "temp_mean": mean(self.temp_history),
+            "temp_min": temp_min,
+            "temp_max": temp_max,
+            "temp_std": std_dev(self.temp_history)
+        }
+        return payload
+
+
+def replay(records, analyser=None, sinks=(), speed=0,
+           clock=time.monotonic, sleep=time.sleep):
+    """
+    Drive `records` through `analyser` into `sinks`.
+
+    speed 0 runs as fast as possible, 1 follows the recorded timestamps,
+    N runs N times faster. A timestamp earlier than the previous one
+    marks a device reboot: the analyser is reset and the pacing
+    re-anchored instead of stalling. Returns a report dict.
+    """
+    if analyser is None:
+        analyser = Analyser()
+
+    samples = 0
+    skipped = 0
+    agree = 0
+    labelled = 0
+    labels = {}
+
+    reboots = 0
+
+    anchor_ts = None
+    anchor_wall = None
+    last_ts = None
+    started = clock()
+
+    for record in records:
+        ts = record.get("timestamp")
+        if not isinstance(ts, (int, float)):
+            ts = None
+        if ts is not None and last_ts is not None and ts < last_ts:
+            reboots += 1
+            analyser.reset()
+            anchor_ts = None
+        if ts is not None:
+            last_ts = ts
+
+        if speed > 0 and ts is not None:
+            if anchor_ts is None:
+                anchor_ts = ts
+                anchor_wall = clock()
+            delay = anchor_wall + (ts - anchor_ts) / speed - clock()
+            if delay > 0:
+                sleep(delay)
+
+        payload = analyser.analyse(record)
+        if payload is None:
+            skipped += 1
+            continue
+        samples += 1
+
+        state = payload["local"]["time_of_day"]
+        labels[state] = labels.get(state, 0) + 1
+        recorded = (record.get("local") or {}).get("time_of_day")
+        if recorded is not None:
+            labelled += 1
+            if recorded == state:
+                agree += 1
+
+        for sink in sinks:
+            sink(payload)
+
+    elapsed = clock() - started
+    return {
+        "samples": samples,
+        "skipped": skipped,
+        "reboots": reboots,
+        "elapsed_s": elapsed,
+        "samples_per_s": samples / elapsed if elapsed > 0 else None,
+        "labels": labels,
+        "label_agreement": agree / labelled if labelled else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("capture")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="0 = as fast as possible, 1 = wall clock")
+    parser.add_argument("--window", type=int, default=LUX_HISTORY_SIZE)
+    parser.add_argument("--day-threshold", type=float, default=DAY_THRESHOLD)
+    parser.add_argument("--night-threshold", type=float, default=NIGHT_THRESHOLD)
+    parser.add_argument("--epsilon", type=float, default=TREND_EPSILON)
+    parser.add_argument("--out", help="write replayed payloads as JSONL")
+    parser.add_argument("--print", action="store_true",
+                        help="print replayed payloads to stdout")
+    args = parser.parse_args(argv)
+
+    analyser = Analyser(args.window, args.day_threshold,
+                        args.night_threshold, args.epsilon)
+
+    sinks = []
+    out = None
+    if args.out:
+        out = open(args.out, "w")
+        sinks.append(lambda p: out.write(json.dumps(p) + "\n"))
+    if args.print:
+        sinks.append(lambda p: print(json.dumps(p)))
+
+    try:
+        report = replay(read_jsonl(args.capture), analyser, sinks, args.speed)
+    finally:
+        if out is not None:
+            out.close()
+
+    print(json.dumps(report), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+ring_buffer.py
+Fixed-capacity sample history backed by array('f')
+"""
+
+from array import array
+
+
+class RingBuffer:
+    """
+    Preallocated circular buffer of floats.
+
+    append() overwrites the oldest sample once full, so the history never
+    reallocates or shifts. Indexing, iteration and slicing run oldest to
+    newest, like the list it replaces.
+    """
+
+    def __init__(self, capacity, typecode="f"):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._data = array(typecode, [0] * capacity)
+        self._head = 0
+        self._count = 0
+
+    def append(self, value):
+        self._data[self._head] = value
+        self._head += 1
+        if self._head == self.capacity:
+            self._head = 0
+        if self._count < self.capacity:
+            self._count += 1
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+
+    def is_full(self):
+        return self._count == self.capacity
+
+    def _start(self):
+        # Physical index of the oldest sample
+        return (self._head - self._count) % self.capacity
+
+    def view(self):
+        return RingView(self._data, self._start(), self._count)
+
+    def last(self, k):
+        """
+        Zero-copy view of the newest `k` samples.
+        """
+        if k > self._count:
+            k = self._count
+        if k < 0:
+            k = 0
+        start = (self._head - k) % self.capacity
+        return RingView(self._data, start, k)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+
+class RingView:
+    """
+    Read-only window onto a RingBuffer.
+
+    Views share storage with the buffer and are only meaningful until
+    the next append().
+    """
+
+    def __init__(self, data, start, length):
+        self._data = data
+        self._start = start
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        data = self._data
+        size = len(data)
+        i = self._start
+        for _ in range(self._length):
+            yield data[i]
+            i += 1
+            if i == size:
+                i = 0
+
+    def __getitem__(self, index):
+        n = self._length
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                raise ValueError("slice step not supported")
+            start = _clamp(index.start, n, 0)
+            stop = _clamp(index.stop, n, n)
+            if stop < start:
+                stop = start
+            return RingView(
+                self._data,
+                (self._start + start) % len(self._data),
+                stop - start
+            )
+
+        if index < 0:
+            index += n
+        if index < 0 or index >= n:
+            raise IndexError("ring index out of range")
+        return self._data[(self._start + index) % len(self._data)]
+
+
+def _clamp(index, n, default):
+    if index is None:
+        return default
+    if index < 0:
+        index += n
+        if index < 0:
+            return 0
+    if index > n:
+        return n
+    return index
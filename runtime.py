@@ -0,0 +1,417 @@
+"""
+ESP32 Weather Station (asyncio runtime)
+
+- Samples AHT30 + LDR on a fixed, drift-free cadence
+- Refreshes API data in its own task
+- Fans each payload out to independent sink tasks (serial, SD, Node-RED)
+  through bounded queues, so a slow sink drops samples instead of
+  delaying the next one
+
+Runs under asyncio on CPython and on the asyncio module of recent
+MicroPython firmware (uasyncio on older builds).
+"""
+
+import json
+import sys
+import time
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio  # type: ignore
+
+from config import (API_KEY, CITY, API_INTERVAL, LUX_HISTORY_SIZE,
+                    SAMPLE_INTERVAL, SERIAL_FORMAT, DELTA_SINKS, KEYFRAME_EVERY,
+                    STATION_ID)
+from day_night import TrendClassifier
+from statistics import RollingCovariance, RollingStats, WindowedQuantiles
+from weather_api import api_stub
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+# Series in the rolling correlation matrix; api_* are None while offline
+CORRELATION_FIELDS = ("temp", "hum", "lux", "api_temp", "api_hum")
+
+
+def ticks_ms():
+    if hasattr(time, "ticks_ms"):
+        return time.ticks_ms()
+    return int(time.monotonic() * 1000)
+
+
+def ticks_diff(a, b):
+    if hasattr(time, "ticks_diff"):
+        return time.ticks_diff(a, b)
+    return a - b
+
+
+async def sleep_ms(ms):
+    if hasattr(asyncio, "sleep_ms"):
+        await asyncio.sleep_ms(ms)
+    else:
+        await asyncio.sleep(ms / 1000)
+
+
+class Worker:
+    """
+    A `_thread` that runs blocking calls for run_blocking() on
+    MicroPython, whose asyncio has no to_thread(). Calls run one at a
+    time; the awaiting task sleeps until the worker signals completion.
+    """
+
+    def __init__(self, poll_ms=10):
+        import _thread
+        self.poll_ms = poll_ms
+        self._job = None
+        self._done = False
+        self._result = None
+        self._error = None
+        self._busy = asyncio.Lock()
+        # ThreadSafeFlag can be set from another thread; older builds poll
+        flag = getattr(asyncio, "ThreadSafeFlag", None)
+        self._flag = flag() if flag is not None else None
+        self._start = _thread.allocate_lock()
+        self._start.acquire()
+        _thread.start_new_thread(self._loop, ())
+
+    def _loop(self):
+        while True:
+            self._start.acquire()
+            fn, args = self._job
+            try:
+                self._result = fn(*args)
+            except Exception as e:
+                self._error = e
+            self._done = True
+            if self._flag is not None:
+                self._flag.set()
+
+    async def call(self, fn, *args):
+        async with self._busy:
+            self._job = (fn, args)
+            self._done = False
+            self._result = None
+            self._error = None
+            self._start.release()
+            while not self._done:
+                if self._flag is not None:
+                    await self._flag.wait()
+                else:
+                    await sleep_ms(self.poll_ms)
+            if self._error is not None:
+                raise self._error
+            return self._result
+
+
+def new_worker():
+    """
+    A Worker where blocking calls would otherwise run on the event
+    loop, or None (CPython uses to_thread; firmware without threads
+    runs them inline).
+    """
+    if hasattr(asyncio, "to_thread"):
+        return None
+    try:
+        return Worker()
+    except ImportError:
+        return None
+
+
+_default_worker = None
+
+
+async def run_blocking(fn, *args, worker=None):
+    """
+    Run a blocking call off the event loop: asyncio.to_thread on
+    CPython, `worker` (or a shared Worker) on MicroPython, inline only
+    when the firmware has no threads.
+    """
+    global _default_worker
+    to_thread = getattr(asyncio, "to_thread", None)
+    if to_thread is not None:
+        return await to_thread(fn, *args)
+    if worker is None:
+        if _default_worker is None:
+            _default_worker = new_worker()
+        worker = _default_worker
+    if worker is None:
+        return fn(*args)
+    return await worker.call(fn, *args)
+
+
+class BoundedQueue:
+    """
+    Small FIFO between the sampler and one sink.
+
+    put_nowait() never blocks: when full it either evicts the oldest
+    item (DROP_OLDEST) or rejects the new one (DROP_NEWEST) and counts
+    the drop.
+    """
+
+    def __init__(self, maxsize, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError("unknown drop policy: %s" % policy)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self._items = []
+        self._event = asyncio.Event()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put_nowait(self, item):
+        if len(self._items) >= self.maxsize:
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return False
+            self._items.pop(0)
+        self._items.append(item)
+        self._event.set()
+        return True
+
+    async def get(self):
+        while not self._items:
+            self._event.clear()
+            await self._event.wait()
+        return self._items.pop(0)
+
+
+async def periodic(interval, fn):
+    """
+    Call `await fn()` every `interval` seconds against fixed deadlines,
+    so run time does not accumulate as drift. Missed ticks are skipped.
+    """
+    period = int(interval * 1000)
+    deadline = ticks_ms()
+    while True:
+        await fn()
+        deadline += period
+        late = ticks_diff(ticks_ms(), deadline)
+        if late >= 0:
+            # Overran one or more periods: realign to the next tick
+            deadline += (late // period + 1) * period
+        await sleep_ms(ticks_diff(deadline, ticks_ms()))
+
+
+class Sink:
+    def __init__(self, name, send, maxsize=16, policy=DROP_OLDEST,
+                 blocking=False):
+        self.name = name
+        self.send = send
+        self.blocking = blocking
+        # Own worker, so a stalled network sink does not hold up the SD card
+        self.worker = new_worker() if blocking else None
+        self.queue = BoundedQueue(maxsize, policy)
+        self.sent = 0
+        self.errors = 0
+
+    async def run(self):
+        while True:
+            payload = await self.queue.get()
+            try:
+                if self.blocking:
+                    await run_blocking(self.send, payload, worker=self.worker)
+                else:
+                    self.send(payload)
+                self.sent += 1
+            except Exception:
+                self.errors += 1
+
+
+class Runtime:
+    def __init__(self, aht, ldr, sinks, weather=None,
+                 sample_interval=SAMPLE_INTERVAL, api_interval=API_INTERVAL,
+                 history_size=LUX_HISTORY_SIZE, mode="async_serial",
+                 clock=time.time):
+        self.aht = aht
+        self.ldr = ldr
+        self.sinks = sinks
+        self.weather = weather
+        self.sample_interval = sample_interval
+        self.api_interval = api_interval
+        self.mode = mode
+        self.clock = clock
+
+        self.lux_stats = RollingStats(history_size)
+        self.trend = TrendClassifier(history_size)
+        self.lux_quantiles = WindowedQuantiles(history_size)
+        self.temp_quantiles = WindowedQuantiles(history_size)
+        self.correlation = RollingCovariance(CORRELATION_FIELDS, history_size)
+        # Local-minus-API offsets against elapsed seconds, for bias/drift
+        self.bias = RollingCovariance(("t", "temp", "hum"), history_size)
+        self.started = clock()
+        self.api_data = api_stub(CITY) if weather is None else weather.get()
+        self.samples = 0
+        self.sensor_errors = 0
+
+    def build_payload(self, now, temp, hum, lux, state):
+        stats = self.lux_stats.as_dict("lux")
+        stats.update(self.lux_quantiles.as_dict("lux"))
+        stats.update(self.temp_quantiles.as_dict("temp"))
+        stats.update(self.bias_stats())
+        stats["corr"] = self.correlation.correlations()
+        return {
+            "timestamp": now,
+            "mode": self.mode,
+            "local": {
+                "temperature_c": temp,
+                "humidity_percent": hum,
+                "light_lux": lux,
+                "time_of_day": state
+            },
+            "api": self.api_data,
+            "stats": stats
+        }
+
+    def track_api_offsets(self, now, temp, hum, lux):
+        api_temp = self.api_data.get("temperature_c")
+        api_hum = self.api_data.get("humidity_percent")
+        self.correlation.push((temp, hum, lux, api_temp, api_hum))
+        self.bias.push((
+            now - self.started,
+            None if api_temp is None else temp - api_temp,
+            None if api_hum is None else hum - api_hum
+        ))
+
+    def bias_stats(self):
+        """
+        Mean local-minus-API offset and its drift per hour over the
+        window, e.g. a sensor warming up or a bad calibration.
+        """
+        stats = {}
+        for name in ("temp", "hum"):
+            _, _, bias, _, _, slope = self.bias.pair_stats("t", name)
+            stats[name + "_bias"] = bias
+            stats[name + "_drift_per_h"] = None if slope is None else slope * 3600
+        return stats
+
+    async def sample(self):
+        now = self.clock()
+        temp, hum = await self.aht.read_async()
+        if temp is None:
+            self.sensor_errors += 1
+            return
+
+        lux = self.ldr.read_lux()
+        self.lux_stats.push(lux)
+        self.lux_quantiles.add(lux)
+        self.temp_quantiles.add(temp)
+        self.track_api_offsets(now, temp, hum, lux)
+        state = self.trend.update(lux)
+
+        payload = self.build_payload(now, temp, hum, lux, state)
+        self.samples += 1
+        for sink in self.sinks:
+            sink.queue.put_nowait(payload)
+
+    async def refresh_api(self):
+        self.api_data = await run_blocking(self.weather.get)
+
+    async def run(self):
+        tasks = [asyncio.create_task(sink.run()) for sink in self.sinks]
+        if self.weather is not None:
+            tasks.append(asyncio.create_task(
+                periodic(self.api_interval, self.refresh_api)
+            ))
+        await periodic(self.sample_interval, self.sample)
+
+
+# Sinks whose send() either delivers every message or raises. Node-RED
+# and SD swallow failures (and NodeRedSender drops from the middle of
+# its buffer), so a lost delta there would go unnoticed until the next
+# keyframe.
+DELTA_CAPABLE = ("serial",)
+
+
+def delta_send(send, keyframe_every=KEYFRAME_EVERY, station=STATION_ID):
+    """
+    Wrap a sink's send() so it emits delta.py keyframes and deltas.
+    The encoder runs after the sink's queue, so samples dropped there
+    never break the chain; a send that raises forces the next keyframe.
+    """
+    from delta import DeltaEncoder
+    encoder = DeltaEncoder(keyframe_every, station)
+
+    def send_delta(payload):
+        message = encoder.encode(payload)
+        try:
+            send(message)
+        except Exception:
+            encoder.reset()
+            raise
+    return send_delta
+
+
+def serial_sink(maxsize=8, fmt=SERIAL_FORMAT):
+    """
+    "json" prints one JSON line per sample; "binary" writes wire.py
+    frames, which the host turns back into JSON with wire.FrameDecoder.
+    """
+    if fmt == "binary":
+        from wire import FrameEncoder
+        encoder = FrameEncoder()
+        out = getattr(sys.stdout, "buffer", sys.stdout)
+        return Sink("serial", lambda payload: out.write(encoder.encode(payload)),
+                    maxsize)
+    if fmt != "json":
+        raise ValueError("unknown serial format: %s" % fmt)
+    return Sink("serial", lambda payload: print(json.dumps(payload)), maxsize)
+
+
+def main():
+    from machine import Pin, I2C, ADC  # type: ignore
+    from aht30 import AHT30
+    from light import LightSensor
+    from config import LDR_OVERSAMPLE, LDR_REDUCER, MQTT_BROKER, NODE_RED_URL
+    from sdcard_fs import SDSession
+    from wifi import connect_to_internet
+
+    i2c = I2C(0, scl=Pin(22), sda=Pin(21))
+    aht = AHT30(i2c)
+
+    ldr_adc = ADC(Pin(32))
+    ldr_adc.atten(ADC.ATTN_11DB)
+    ldr_adc.width(ADC.WIDTH_12BIT)
+    ldr = LightSensor(ldr_adc, LDR_OVERSAMPLE, LDR_REDUCER)
+
+    sd_session = SDSession()
+    sinks = [
+        serial_sink(),
+        Sink("sd", sd_session.append, maxsize=64, blocking=True)
+    ]
+
+    # Network sinks only when the link came up; serial and SD always run
+    online = bool(API_KEY or NODE_RED_URL or MQTT_BROKER) and connect_to_internet()
+
+    weather = None
+    if online and API_KEY:
+        from weather_api import WeatherClient
+        weather = WeatherClient(API_KEY, CITY, ttl=API_INTERVAL)
+
+    if online and NODE_RED_URL:
+        import nodered
+        sinks.append(Sink("nodered", nodered.send, maxsize=32, blocking=True))
+
+    if online and MQTT_BROKER:
+        import mqtt_sink
+        sinks.append(Sink("mqtt", mqtt_sink.send, maxsize=32, blocking=True))
+
+    for name in DELTA_SINKS:
+        if name not in DELTA_CAPABLE:
+            raise ValueError("sink %r cannot report lost messages; "
+                             "delta mode needs one of %s" % (name, DELTA_CAPABLE))
+    for sink in sinks:
+        # Binary frames already send the api block only on change
+        if sink.name in DELTA_SINKS and not (
+            sink.name == "serial" and SERIAL_FORMAT == "binary"
+        ):
+            sink.send = delta_send(sink.send)
+
+    print("ESP32 ASYNC MODE — SERIAL STREAM STARTED")
+    asyncio.run(Runtime(aht, ldr, sinks, weather).run())
+
+
+if __name__ == "__main__":
+    main()
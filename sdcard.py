@@ -1,46 +1,248 @@
 # sdcard.py
 # MicroPython SD card driver (SPI mode)
 
-from machine import SPI, Pin
-import os
+import time
+
+BLOCK_SIZE = 512
+
+_CMD_TIMEOUT = 100
+_TOKEN_TIMEOUT = 20000
+
+_R1_IDLE_STATE = 0x01
+_R1_ILLEGAL_COMMAND = 0x04
+
+_TOKEN_DATA = 0xFE
+_TOKEN_CMD25 = 0xFC
+_TOKEN_STOP_TRAN = 0xFD
+
+_EIO = 5
+_ETIMEDOUT = 110
 
 class SDCard:
     def __init__(self, spi, cs):
         self.spi = spi
         self.cs = cs
+
+        # Preallocated so the transfer paths do not allocate
+        self.cmdbuf = bytearray(6)
+        self.tokenbuf = bytearray(1)
+        self.respbuf = bytearray(4)
+        self.crcbuf = bytearray(2)
+
+        self.sectors = 0
+        self.cdv = 1
+
         self.cs.init(self.cs.OUT, value=1)
         self.init_card()
 
     def init_card(self):
         self.cs.value(1)
-        for _ in range(10):
+        for _ in range(16):
             self.spi.write(b'\xff')
+
+        # CMD0: software reset, card answers "idle"
+        for _ in range(5):
+            if self.cmd(0, 0, 0x95) == _R1_IDLE_STATE:
+                break
+        else:
+            raise OSError("no SD card")
+
+        # CMD8: only v2 cards understand it
+        r = self.cmd(8, 0x01AA, 0x87, 4)
+        if r == _R1_IDLE_STATE:
+            self.init_card_v2()
+        elif r == (_R1_IDLE_STATE | _R1_ILLEGAL_COMMAND):
+            self.init_card_v1()
+        else:
+            raise OSError("couldn't determine SD card version")
+
+        # CMD9: read the CSD register to get the real capacity
+        if self.cmd(9, 0, 0, 0, False) != 0:
+            raise OSError("no response from SD card")
+        csd = bytearray(16)
+        self.readinto(csd)
+        self.sectors = self.parse_csd(csd)
+
+        # CMD16: fix the block length at 512 bytes
+        if self.cmd(16, BLOCK_SIZE, 0) != 0:
+            raise OSError("can't set 512 block size")
+
+    @staticmethod
+    def parse_csd(csd):
+        """
+        Return the card capacity in 512-byte blocks.
+        """
+        version = csd[0] & 0xC0
+        if version == 0x40:
+            # CSD 2.0 (SDHC/SDXC)
+            c_size = (csd[7] & 0x3F) << 16 | csd[8] << 8 | csd[9]
+            return (c_size + 1) * 1024
+        if version == 0x00:
+            # CSD 1.0 (SDSC, up to 2 GB)
+            c_size = (csd[6] & 0x03) << 10 | csd[7] << 2 | csd[8] >> 6
+            c_size_mult = (csd[9] & 0x03) << 1 | csd[10] >> 7
+            read_bl_len = csd[5] & 0x0F
+            capacity = (c_size + 1) << (c_size_mult + 2 + read_bl_len)
+            return capacity // BLOCK_SIZE
+        raise OSError("SD card CSD format not supported")
+
+    def init_card_v1(self):
+        for _ in range(_CMD_TIMEOUT):
+            self.cmd(55, 0, 0)
+            if self.cmd(41, 0, 0) == 0:
+                # SDSC cards are byte addressed
+                self.cdv = BLOCK_SIZE
+                return
+            time.sleep(0.05)
+        raise OSError("timeout waiting for v1 card")
+
+    def init_card_v2(self):
+        for _ in range(_CMD_TIMEOUT):
+            self.cmd(55, 0, 0)
+            if self.cmd(41, 0x40000000, 0) == 0:
+                self.cmd(58, 0, 0, 4)
+                # CCS bit set means block addressing (SDHC/SDXC)
+                self.cdv = 1 if self.respbuf[0] & 0x40 else BLOCK_SIZE
+                return
+            time.sleep(0.05)
+        raise OSError("timeout waiting for v2 card")
+
+    def cmd(self, cmd, arg, crc, final=0, release=True, skip1=False):
         self.cs.value(0)
-        self.spi.write(b'\x40\x00\x00\x00\x00\x95')
+
+        buf = self.cmdbuf
+        buf[0] = 0x40 | cmd
+        buf[1] = arg >> 24
+        buf[2] = (arg >> 16) & 0xFF
+        buf[3] = (arg >> 8) & 0xFF
+        buf[4] = arg & 0xFF
+        buf[5] = crc
+        self.spi.write(buf)
+
+        if skip1:
+            self.spi.readinto(self.tokenbuf, 0xFF)
+
+        for _ in range(_CMD_TIMEOUT):
+            self.spi.readinto(self.tokenbuf, 0xFF)
+            response = self.tokenbuf[0]
+            if not (response & 0x80):
+                if final:
+                    self.spi.readinto(memoryview(self.respbuf)[:final], 0xFF)
+                if release:
+                    self.cs.value(1)
+                    self.spi.write(b'\xff')
+                return response
+
         self.cs.value(1)
         self.spi.write(b'\xff')
+        return -1
 
-    def readblocks(self, block_num, buf):
+    def _wait_token(self, token):
+        tokenbuf = self.tokenbuf
+        for _ in range(_TOKEN_TIMEOUT):
+            self.spi.readinto(tokenbuf, 0xFF)
+            if tokenbuf[0] == token:
+                return
+        self.cs.value(1)
+        self.spi.write(b'\xff')
+        raise OSError(_ETIMEDOUT)
+
+    def _wait_not_busy(self):
+        tokenbuf = self.tokenbuf
+        for _ in range(_TOKEN_TIMEOUT):
+            self.spi.readinto(tokenbuf, 0xFF)
+            if tokenbuf[0] != 0x00:
+                return
+        self.cs.value(1)
+        self.spi.write(b'\xff')
+        raise OSError(_ETIMEDOUT)
+
+    def readinto(self, buf):
         self.cs.value(0)
-        self.spi.write(b'\x51')
-        self.spi.write(block_num.to_bytes(4, 'big'))
-        self.spi.write(b'\x00')
-        while self.spi.read(1)[0] != 0xfe:
-            pass
-        self.spi.readinto(buf)
+        self._wait_token(_TOKEN_DATA)
+        self.spi.readinto(buf, 0xFF)
+        # Discard the CRC
+        self.spi.readinto(self.crcbuf, 0xFF)
         self.cs.value(1)
+        self.spi.write(b'\xff')
 
-    def writeblocks(self, block_num, buf):
+    def write(self, token, buf):
         self.cs.value(0)
-        self.spi.write(b'\x58')
-        self.spi.write(block_num.to_bytes(4, 'big'))
-        self.spi.write(b'\x00')
-        self.spi.write(b'\xfe')
+        self.tokenbuf[0] = token
+        self.spi.write(self.tokenbuf)
         self.spi.write(buf)
+        self.spi.write(b'\xff\xff')
+
+        self.spi.readinto(self.tokenbuf, 0xFF)
+        if (self.tokenbuf[0] & 0x1F) != 0x05:
+            self.cs.value(1)
+            self.spi.write(b'\xff')
+            raise OSError(_EIO)
+
+        self._wait_not_busy()
         self.cs.value(1)
+        self.spi.write(b'\xff')
+
+    def write_token(self, token):
+        self.cs.value(0)
+        self.tokenbuf[0] = token
+        self.spi.write(self.tokenbuf)
+        self.spi.write(b'\xff')
+        self._wait_not_busy()
+        self.cs.value(1)
+        self.spi.write(b'\xff')
+
+    def readblocks(self, block_num, buf):
+        nblocks, rest = divmod(len(buf), BLOCK_SIZE)
+        if not nblocks or rest:
+            raise ValueError("buffer length must be a multiple of 512")
+        mv = memoryview(buf)
+
+        if nblocks == 1:
+            # CMD17: single block read
+            if self.cmd(17, block_num * self.cdv, 0, release=False) != 0:
+                self.cs.value(1)
+                raise OSError(_EIO)
+            self.readinto(mv)
+            return
+
+        # CMD18: multi-block read, ended by CMD12
+        if self.cmd(18, block_num * self.cdv, 0, release=False) != 0:
+            self.cs.value(1)
+            raise OSError(_EIO)
+        offset = 0
+        while nblocks:
+            self.readinto(mv[offset:offset + BLOCK_SIZE])
+            offset += BLOCK_SIZE
+            nblocks -= 1
+        if self.cmd(12, 0, 0xFF, skip1=True):
+            raise OSError(_EIO)
+
+    def writeblocks(self, block_num, buf):
+        nblocks, rest = divmod(len(buf), BLOCK_SIZE)
+        if not nblocks or rest:
+            raise ValueError("buffer length must be a multiple of 512")
+        mv = memoryview(buf)
+
+        if nblocks == 1:
+            # CMD24: single block write
+            if self.cmd(24, block_num * self.cdv, 0) != 0:
+                raise OSError(_EIO)
+            self.write(_TOKEN_DATA, mv)
+            return
+
+        # CMD25: multi-block write, ended by the stop token
+        if self.cmd(25, block_num * self.cdv, 0) != 0:
+            raise OSError(_EIO)
+        offset = 0
+        while nblocks:
+            self.write(_TOKEN_CMD25, mv[offset:offset + BLOCK_SIZE])
+            offset += BLOCK_SIZE
+            nblocks -= 1
+        self.write_token(_TOKEN_STOP_TRAN)
 
     def ioctl(self, op, arg):
         if op == 4:  # get number of blocks
-            return 0
+            return self.sectors
         if op == 5:  # get block size
-            return 512
+            return BLOCK_SIZE
@@ -0,0 +1,192 @@
+"""
+sdcard_fake.py
+In-memory SD card behind a fake SPI bus, for exercising sdcard.SDCard
+on Linux without hardware.
+
+    cs = FakePin()
+    spi = FakeSPI(cs, blocks=2048)
+    sd = sdcard.SDCard(spi, cs)
+"""
+
+BLOCK_SIZE = 512
+
+
+class FakePin:
+    OUT = 1
+
+    def __init__(self):
+        self._value = 1
+
+    def init(self, mode=None, value=None):
+        if value is not None:
+            self._value = value
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = v
+
+
+class FakeSPI:
+    """
+    Byte-level model of an SDHC card in SPI mode.
+
+    Commands, data tokens and blocks are parsed from the bytes the host
+    clocks out; responses are queued and returned on the following
+    reads. Bytes sent while chip select is high are ignored, as on a
+    real bus. `commands` records every command index received.
+    """
+
+    def __init__(self, cs, blocks=2048):
+        if blocks % 1024:
+            raise ValueError("blocks must be a multiple of 1024")
+        self.cs = cs
+        self.blocks = blocks
+        self.storage = bytearray(blocks * BLOCK_SIZE)
+        self.commands = []
+
+        self._out = bytearray()
+        self._frame = bytearray()
+        self._state = "cmd"
+        self._idle = True
+        self._app_cmd = False
+        self._block = 0
+        self._multi = False
+
+    # --- SPI API used by the driver ---------------------------------
+
+    def write(self, buf):
+        for b in buf:
+            self._clock(b)
+
+    def read(self, nbytes, write=0x00):
+        buf = bytearray(nbytes)
+        self.readinto(buf, write)
+        return bytes(buf)
+
+    def readinto(self, buf, write=0x00):
+        for i in range(len(buf)):
+            buf[i] = self._clock(write)
+
+    # --- card model -------------------------------------------------
+
+    def _clock(self, b):
+        if self.cs.value():
+            return 0xFF
+
+        if self._out:
+            out = self._out[0]
+            del self._out[0]
+        elif self._state == "multi_read":
+            self._queue_block()
+            out = 0xFF
+        else:
+            out = 0xFF
+
+        self._receive(b)
+        return out
+
+    def _receive(self, b):
+        state = self._state
+
+        if state in ("cmd", "multi_read"):
+            if not self._frame and (b & 0xC0) != 0x40:
+                return
+            self._frame.append(b)
+            if len(self._frame) == 6:
+                frame = self._frame
+                self._frame = bytearray()
+                self._command(frame[0] & 0x3F,
+                              int.from_bytes(frame[1:5], "big"))
+            return
+
+        if state == "await_data":
+            if b == 0xFF:
+                return
+            if b in (0xFE, 0xFC):
+                self._frame = bytearray()
+                self._state = "data"
+            elif b == 0xFD and self._multi:
+                self._out += b"\x00\x00"
+                self._state = "cmd"
+            return
+
+        if state == "data":
+            self._frame.append(b)
+            if len(self._frame) == BLOCK_SIZE + 2:
+                start = self._block * BLOCK_SIZE
+                self.storage[start:start + BLOCK_SIZE] = self._frame[:BLOCK_SIZE]
+                self._frame = bytearray()
+                self._block += 1
+                # Data accepted, then a short busy period
+                self._out += b"\x05\x00\x00"
+                self._state = "await_data" if self._multi else "cmd"
+
+    def _respond(self, r1, extra=b""):
+        self._out = bytearray(b"\xff")
+        self._out.append(r1)
+        self._out += extra
+
+    def _queue_block(self):
+        start = self._block * BLOCK_SIZE
+        self._out += b"\xff\xfe"
+        self._out += self.storage[start:start + BLOCK_SIZE]
+        self._out += b"\xff\xff"
+        self._block += 1
+
+    def _command(self, index, arg):
+        self.commands.append(index)
+        app_cmd = self._app_cmd
+        self._app_cmd = False
+        idle = 0x01 if self._idle else 0x00
+
+        if index == 0:
+            self._idle = True
+            self._state = "cmd"
+            self._respond(0x01)
+        elif index == 8:
+            self._respond(idle, arg.to_bytes(4, "big"))
+        elif index == 55:
+            self._app_cmd = True
+            self._respond(idle)
+        elif index == 41 and app_cmd:
+            self._idle = False
+            self._respond(0x00)
+        elif index == 58:
+            # OCR with power-up and CCS (block addressing) bits set
+            self._respond(idle, b"\xc0\xff\x80\x00")
+        elif index == 9:
+            self._respond(0x00, b"\xff\xfe" + self._csd() + b"\xff\xff")
+        elif index == 16:
+            self._respond(0x00)
+        elif index in (17, 18):
+            if arg >= self.blocks:
+                self._respond(0x40)
+                return
+            self._block = arg
+            self._respond(0x00)
+            self._queue_block()
+            self._state = "multi_read" if index == 18 else "cmd"
+        elif index == 12:
+            # Stuff byte, then R1
+            self._state = "cmd"
+            self._out = bytearray(b"\xff\xff\x00")
+        elif index in (24, 25):
+            if arg >= self.blocks:
+                self._respond(0x40)
+                return
+            self._block = arg
+            self._multi = index == 25
+            self._state = "await_data"
+            self._respond(0x00)
+        else:
+            self._respond(idle | 0x04)
+
+    def _csd(self):
+        csd = bytearray(16)
+        csd[0] = 0x40
+        c_size = self.blocks // 1024 - 1
+        csd[7] = (c_size >> 16) & 0x3F
+        csd[8] = (c_size >> 8) & 0xFF
+        csd[9] = c_size & 0xFF
+        return bytes(csd)
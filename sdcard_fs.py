@@ -1,11 +1,114 @@
+import json
 import os
-from machine import SPI, Pin
+import time
 import sdcard
 from config import SD_MOUNT_POINT
+from logger import BufferedJsonlLogger
 
 def mount_sd():
+    from machine import SPI, Pin  # type: ignore
     spi = SPI(2, baudrate=10_000_000,
               sck=Pin(18), mosi=Pin(23), miso=Pin(19))
     cs = Pin(5, Pin.OUT)
     sd = sdcard.SDCard(spi, cs)
     os.mount(sd, SD_MOUNT_POINT)
+    return sd
+
+
+class SDSession:
+    """
+    Long-lived SD card logging session.
+
+    Mounts the card once and appends through a BufferedJsonlLogger.
+    After a mount or write error the session marks itself unhealthy,
+    drops samples and only retries the mount after an exponential
+    backoff, so a missing card never stalls the sampling loop.
+    """
+
+    def __init__(self, mount=mount_sd, mount_point=SD_MOUNT_POINT,
+                 min_backoff=1, max_backoff=300, clock=time.time,
+                 **logger_options):
+        self.mount = mount
+        self.mount_point = mount_point
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+
+        self.mounted = False
+        self.failures = 0
+        self.dropped = 0
+        self.last_error = None
+
+        self._was_mounted = False
+        self._next_attempt = 0
+        self.logger = BufferedJsonlLogger(
+            mount_point, clock=clock, **logger_options
+        )
+
+    def healthy(self):
+        return self.mounted
+
+    def _unmount(self):
+        try:
+            os.umount(self.mount_point)
+        except (AttributeError, OSError):
+            pass
+
+    def _ensure_mounted(self, now):
+        if self.mounted:
+            return True
+        if now < self._next_attempt:
+            return False
+        try:
+            if self._was_mounted:
+                self._unmount()
+            self.mount()
+        except Exception as e:
+            self._failed(now, e)
+            return False
+
+        self.mounted = True
+        self._was_mounted = True
+        self.failures = 0
+        return True
+
+    def _failed(self, now, error):
+        self.mounted = False
+        self.last_error = error
+        self.failures += 1
+        delay = self.min_backoff * (2 ** (self.failures - 1))
+        self._next_attempt = now + min(delay, self.max_backoff)
+        self.logger.reopen()
+
+    def append(self, payload):
+        """
+        Queue one payload. Returns False while the card is unavailable.
+        """
+        now = self.clock()
+        if not self._ensure_mounted(now):
+            self.dropped += 1
+            return False
+        try:
+            self.logger.write_line(json.dumps(payload), now)
+        except OSError as e:
+            self._failed(now, e)
+            return False
+        return True
+
+    def flush(self):
+        if not self.mounted:
+            return False
+        try:
+            self.logger.flush()
+        except OSError as e:
+            self._failed(self.clock(), e)
+            return False
+        return True
+
+    def close(self):
+        if self.mounted:
+            try:
+                self.logger.close()
+            except OSError:
+                pass
+        self.mounted = False
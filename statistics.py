@@ -176,3 +176,536 @@ def correlation(xs, ys):
 
     return num / (dx * dy) ** 0.5
 
+
+# -----------------------------
+# 8. Rolling Statistics
+# -----------------------------
+def _bisect_left(sorted_vals, x):
+    lo = 0
+    hi = len(sorted_vals)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if sorted_vals[mid] < x:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class RollingStats:
+    """
+    Incremental statistics over the last `capacity` samples.
+
+    Fed one sample at a time with push(). Mean and variance use a
+    sliding Welford update, min/max use monotonic queues and the
+    median uses a sorted copy of the window updated by binary search,
+    so no call rescans the whole window. The Welford downdate loses
+    precision over a long run, so every `capacity` pushes the sums are
+    recomputed exactly from the ring (amortised O(1)), and also right
+    after an eviction cancels most of m2 (a spike leaving the window).
+    """
+
+    def __init__(self, capacity, window=10):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.window = min(window, capacity) if window > 0 else 0
+
+        self._values = [0.0] * capacity
+        self._head = 0
+        self._count = 0
+        self._seq = 0
+
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._window_sum = 0.0
+        self._since_resync = 0
+
+        self._sorted = []
+
+        # Monotonic queues of (seq, value); a head index avoids pop(0)
+        self._min_q = []
+        self._min_head = 0
+        self._max_q = []
+        self._max_head = 0
+
+    def __len__(self):
+        return self._count
+
+    def _at(self, age):
+        # age 0 is the newest sample
+        return self._values[(self._head - 1 - age) % self.capacity]
+
+    def push(self, x):
+        """
+        Add a sample, evicting the oldest once the window is full.
+        """
+        if self.window:
+            self._window_sum += x
+            if self._count >= self.window:
+                self._window_sum -= self._at(self.window - 1)
+
+        if self._count == self.capacity:
+            self._remove(self._values[self._head])
+        else:
+            self._count += 1
+
+        self._values[self._head] = x
+        self._head = (self._head + 1) % self.capacity
+
+        n = self._count
+        d = x - self._mean
+        self._mean += d / n
+        self._m2 += d * (x - self._mean)
+
+        self._since_resync += 1
+        if self._since_resync >= self.capacity:
+            self._resync()
+
+        self._sorted.insert(_bisect_left(self._sorted, x), x)
+
+        seq = self._seq
+        self._seq += 1
+        expired = seq - self.capacity
+        self._min_head = self._push_monotonic(
+            self._min_q, self._min_head, seq, x, expired, True
+        )
+        self._max_head = self._push_monotonic(
+            self._max_q, self._max_head, seq, x, expired, False
+        )
+
+    def _remove(self, x):
+        n = self._count - 1
+        if n == 0:
+            self._mean = 0.0
+            self._m2 = 0.0
+        else:
+            old_mean = self._mean
+            old_m2 = self._m2
+            self._mean = (old_mean * self._count - x) / n
+            self._m2 -= (x - old_mean) * (x - self._mean)
+            if self._m2 < 0:
+                self._m2 = 0.0
+            if self._m2 < old_m2 * 1e-6:
+                # What is left is mostly rounding error
+                self._since_resync = self.capacity
+
+        del self._sorted[_bisect_left(self._sorted, x)]
+
+    def _resync(self):
+        """
+        Recompute mean, m2 and the moving-average sum from the ring,
+        discarding the rounding error the incremental updates collected.
+        """
+        n = self._count
+        total = 0.0
+        for age in range(n):
+            total += self._at(age)
+        mean = total / n
+        m2 = 0.0
+        for age in range(n):
+            d = self._at(age) - mean
+            m2 += d * d
+        window_sum = 0.0
+        for age in range(min(n, self.window)):
+            window_sum += self._at(age)
+
+        self._mean = mean
+        self._m2 = m2
+        self._window_sum = window_sum
+        self._since_resync = 0
+
+    @staticmethod
+    def _push_monotonic(queue, head, seq, x, expired, is_min):
+        while len(queue) > head:
+            last = queue[-1][1]
+            if (is_min and last >= x) or (not is_min and last <= x):
+                queue.pop()
+            else:
+                break
+        queue.append((seq, x))
+
+        while queue[head][0] <= expired:
+            head += 1
+
+        # Compact occasionally so the list does not grow without bound
+        if head > 32 and head * 2 > len(queue):
+            del queue[:head]
+            head = 0
+        return head
+
+    def mean(self):
+        if not self._count:
+            return None
+        return self._mean
+
+    def moving_average(self):
+        if not self._count or not self.window:
+            return None
+        return self._window_sum / min(self._count, self.window)
+
+    def median(self):
+        n = self._count
+        if not n:
+            return None
+        mid = n // 2
+        if n % 2 == 1:
+            return self._sorted[mid]
+        return (self._sorted[mid - 1] + self._sorted[mid]) / 2
+
+    def min_max_range(self):
+        if not self._count:
+            return None, None, None
+        min_val = self._min_q[self._min_head][1]
+        max_val = self._max_q[self._max_head][1]
+        return min_val, max_val, max_val - min_val
+
+    def variance(self):
+        if not self._count:
+            return None
+        return self._m2 / self._count
+
+    def std_dev(self):
+        var = self.variance()
+        if var is None:
+            return None
+        return var ** 0.5
+
+    def as_dict(self, prefix="lux"):
+        """
+        Return the values used in the payload `stats` block.
+        """
+        min_val, max_val, rng = self.min_max_range()
+        return {
+            prefix + "_mean": self.mean(),
+            prefix + "_median": self.median(),
+            prefix + "_min": min_val,
+            prefix + "_max": max_val,
+            prefix + "_range": rng,
+            prefix + "_std": self.std_dev(),
+            prefix + "_moving_avg": self.moving_average()
+        }
+
+
+# -----------------------------
+# 9. Quantile Sketch
+# -----------------------------
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch (KLL style).
+
+    Items live in levels; an item at level h stands for 2**h samples.
+    When a level fills up it is sorted and every other item is promoted
+    to the next level, so memory stays around 3 * k items however many
+    samples are added. Sketches with the same k can be merged, e.g.
+    per-minute sketches into an hourly one.
+    """
+
+    def __init__(self, k=128):
+        if k < 4:
+            raise ValueError("k must be at least 4")
+        self.k = k
+        self.n = 0
+        self.levels = [[]]
+        self._offset = 0
+
+    def __len__(self):
+        return self.n
+
+    def _capacity(self, level):
+        # Lower levels get geometrically smaller buffers
+        depth = len(self.levels) - level - 1
+        cap = int(self.k * (2 / 3) ** depth)
+        return cap if cap > 2 else 2
+
+    def _compact(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items.sort()
+                keep = []
+                if len(items) % 2:
+                    keep.append(items.pop())
+                # Alternate which half survives so rounding errors cancel
+                self.levels[level + 1].extend(items[self._offset::2])
+                self._offset ^= 1
+                self.levels[level] = keep
+            level += 1
+
+    def add(self, x):
+        self.levels[0].append(x)
+        self.n += 1
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compact()
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise ValueError("cannot merge sketches with different k")
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self._compact()
+        return self
+
+    def copy(self):
+        sketch = QuantileSketch(self.k)
+        sketch.n = self.n
+        sketch.levels = [list(items) for items in self.levels]
+        sketch._offset = self._offset
+        return sketch
+
+    def quantile(self, q):
+        """
+        Approximate q-quantile (0 <= q <= 1), or None if empty.
+        """
+        if not self.n:
+            return None
+        weighted = []
+        total = 0
+        for level, items in enumerate(self.levels):
+            weight = 1 << level
+            for v in items:
+                weighted.append((v, weight))
+            total += weight * len(items)
+        weighted.sort()
+
+        rank = q * total
+        seen = 0
+        for v, weight in weighted:
+            seen += weight
+            if seen >= rank:
+                return v
+        return weighted[-1][0]
+
+    def to_dict(self):
+        return {"k": self.k, "n": self.n, "levels": self.levels}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["k"])
+        sketch.n = data["n"]
+        sketch.levels = [list(items) for items in data["levels"]] or [[]]
+        return sketch
+
+
+class WindowedQuantiles:
+    """
+    Approximate quantiles over roughly the last `period` samples.
+
+    Keeps the sketch being filled and the one before it, and answers
+    from their merge, so results always cover between `period` and
+    2 * `period` samples without ever rescanning raw data.
+    """
+
+    def __init__(self, period, k=64):
+        self.period = period
+        self.k = k
+        self._current = QuantileSketch(k)
+        self._previous = None
+        self._merged = None
+
+    def add(self, x):
+        if self._current.n >= self.period:
+            self._previous = self._current
+            self._current = QuantileSketch(self.k)
+        self._current.add(x)
+        self._merged = None
+
+    def quantile(self, q):
+        if self._merged is None:
+            self._merged = self._current.copy()
+            if self._previous is not None:
+                self._merged.merge(self._previous)
+        return self._merged.quantile(q)
+
+    def as_dict(self, prefix):
+        return {
+            prefix + "_p05": self.quantile(0.05),
+            prefix + "_p50": self.quantile(0.5),
+            prefix + "_p95": self.quantile(0.95)
+        }
+
+
+# -----------------------------
+# 10. Rolling Series
+# -----------------------------
+def _rolling(values, window, pick):
+    if window <= 0:
+        return []
+    stats = RollingStats(window, window)
+    out = []
+    for v in values:
+        stats.push(v)
+        out.append(pick(stats))
+    return out
+
+
+def rolling_mean(values, window):
+    """
+    Mean of the trailing `window` values at every position.
+    The first window - 1 results use the values seen so far.
+    """
+    return _rolling(values, window, RollingStats.mean)
+
+
+def rolling_median(values, window):
+    return _rolling(values, window, RollingStats.median)
+
+
+def rolling_std(values, window):
+    return _rolling(values, window, RollingStats.std_dev)
+
+
+def rolling_min(values, window):
+    return _rolling(values, window, lambda s: s.min_max_range()[0])
+
+
+def rolling_max(values, window):
+    return _rolling(values, window, lambda s: s.min_max_range()[1])
+
+
+# -----------------------------
+# 11. Rolling Covariance
+# -----------------------------
+class RollingCovariance:
+    """
+    Running co-moments for every pair of named series over the last
+    `capacity` samples.
+
+    push() takes one value per name (None for a missing reading). Each
+    pair keeps its own sliding Welford means and co-moment over the
+    samples where both values exist, so an update costs O(k^2) for k
+    series regardless of the window length.
+    """
+
+    def __init__(self, names, capacity):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.names = tuple(names)
+        self.capacity = capacity
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+        k = len(self.names)
+        self._pairs = [(i, j) for i in range(k) for j in range(i + 1, k)]
+        self._pair_index = {}
+        for p, (i, j) in enumerate(self._pairs):
+            self._pair_index[(i, j)] = p
+        # Per pair: [n, mean_x, mean_y, m2_x, m2_y, c_xy]
+        self._state = [[0, 0.0, 0.0, 0.0, 0.0, 0.0] for _ in self._pairs]
+
+        self._window = [None] * capacity
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def push(self, values):
+        values = tuple(values)
+        if len(values) != len(self.names):
+            raise ValueError("expected %d values" % len(self.names))
+
+        if self._count == self.capacity:
+            self._remove(self._window[self._head])
+        else:
+            self._count += 1
+        self._window[self._head] = values
+        self._head = (self._head + 1) % self.capacity
+        self._add(values)
+
+    def _add(self, values):
+        for p, (i, j) in enumerate(self._pairs):
+            x = values[i]
+            y = values[j]
+            if x is None or y is None:
+                continue
+            s = self._state[p]
+            n = s[0] + 1
+            dx = x - s[1]
+            dy = y - s[2]
+            s[1] += dx / n
+            s[2] += dy / n
+            s[3] += dx * (x - s[1])
+            s[4] += dy * (y - s[2])
+            s[5] += dx * (y - s[2])
+            s[0] = n
+
+    def _remove(self, values):
+        for p, (i, j) in enumerate(self._pairs):
+            x = values[i]
+            y = values[j]
+            if x is None or y is None:
+                continue
+            s = self._state[p]
+            n = s[0] - 1
+            if n == 0:
+                s[:] = [0, 0.0, 0.0, 0.0, 0.0, 0.0]
+                continue
+            mx = (s[1] * s[0] - x) / n
+            my = (s[2] * s[0] - y) / n
+            s[3] -= (x - mx) * (x - s[1])
+            s[4] -= (y - my) * (y - s[2])
+            s[5] -= (x - mx) * (y - s[2])
+            s[1] = mx
+            s[2] = my
+            s[0] = n
+
+    def _pair(self, a, b):
+        i = self._index[a]
+        j = self._index[b]
+        if i == j:
+            raise ValueError("need two different series")
+        if i < j:
+            return self._state[self._pair_index[(i, j)]], False
+        return self._state[self._pair_index[(j, i)]], True
+
+    def pair_stats(self, a, b):
+        """
+        Return (n, mean_a, mean_b, covariance, correlation, slope of b
+        on a) over the samples where both exist. Undefined values are None.
+        """
+        s, swapped = self._pair(a, b)
+        n, mx, my, m2x, m2y, cxy = s
+        if swapped:
+            mx, my, m2x, m2y = my, mx, m2y, m2x
+        if not n:
+            return 0, None, None, None, None, None
+
+        cov = cxy / n
+        corr = None
+        slope = None
+        if n > 1 and m2x > 0:
+            slope = cxy / m2x
+            if m2y > 0:
+                corr = cxy / (m2x * m2y) ** 0.5
+                corr = max(-1.0, min(1.0, corr))
+        return n, mx, my, cov, corr, slope
+
+    def correlation(self, a, b):
+        return self.pair_stats(a, b)[4]
+
+    def covariance(self, a, b):
+        return self.pair_stats(a, b)[3]
+
+    def correlation_matrix(self):
+        matrix = {}
+        for a in self.names:
+            row = matrix[a] = {}
+            for b in self.names:
+                row[b] = 1.0 if a == b else self.correlation(a, b)
+        return matrix
+
+    def correlations(self, sep="~"):
+        """
+        Upper triangle of the matrix as a flat {"a~b": r} dict.
+        """
+        return {
+            self.names[i] + sep + self.names[j]:
+                self.correlation(self.names[i], self.names[j])
+            for i, j in self._pairs
+        }
@@ -0,0 +1,204 @@
+"""
+statistics_np.py
+NumPy implementations of the statistics.py functions (host only)
+
+Same names, arguments and return conventions as statistics.py (None
+for empty input, plain Python floats), but vectorised, for analysing
+whole captures. Accepts lists, RingBuffer views, array.array and the
+memoryview columns returned by archive.Archive.
+"""
+
+from bisect import bisect_left, insort
+
+import numpy as np
+
+_CHUNK_ELEMENTS = 1 << 22
+
+# Above this window a sorted sliding window beats partitioning copies
+_MEDIAN_PARTITION_MAX = 128
+
+
+def _as_array(values):
+    if isinstance(values, np.ndarray):
+        return values.astype(np.float64, copy=False)
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # Iterables without the sequence protocol (RingView)
+        return np.fromiter(values, dtype=np.float64, count=len(values))
+
+
+def mean(values):
+    a = _as_array(values)
+    if not a.size:
+        return None
+    return float(a.mean())
+
+
+def moving_average(values, window):
+    a = _as_array(values)
+    if not a.size or window <= 0:
+        return None
+    return float(a[-window:].mean())
+
+
+def median(values):
+    a = _as_array(values)
+    if not a.size:
+        return None
+    return float(np.median(a))
+
+
+def min_max_range(values):
+    a = _as_array(values)
+    if not a.size:
+        return None, None, None
+    lo = float(a.min())
+    hi = float(a.max())
+    return lo, hi, hi - lo
+
+
+def variance(values):
+    a = _as_array(values)
+    if not a.size:
+        return None
+    return float(a.var())
+
+
+def std_dev(values):
+    var = variance(values)
+    if var is None:
+        return None
+    return var ** 0.5
+
+
+def correlation(xs, ys):
+    x = _as_array(xs)
+    y = _as_array(ys)
+    n = min(x.size, y.size)
+    if n < 2:
+        return None
+    x = x[-n:] - x[-n:].mean()
+    y = y[-n:] - y[-n:].mean()
+    dx = float(np.dot(x, x))
+    dy = float(np.dot(y, y))
+    if dx == 0 or dy == 0:
+        return None
+    return float(np.dot(x, y)) / (dx * dy) ** 0.5
+
+
+# -----------------------------
+# Rolling series
+# -----------------------------
+def _counts(n, window):
+    # Number of values in each trailing window, growing at the start
+    return np.minimum(np.arange(1, n + 1), window)
+
+
+def _windowed_sum(a, window):
+    """
+    Trailing-window sums using per-block prefix and suffix sums, so the
+    rounding error is bounded by one window rather than the whole series
+    (a plain cumsum difference is not).
+    """
+    n = a.size
+    w = window
+    padded = np.zeros(((n + 2 * w - 2) // w + 1) * w)
+    padded[w - 1:w - 1 + n] = a
+    blocks = padded.reshape(-1, w)
+
+    prefix = np.cumsum(blocks, axis=1).ravel()
+    suffix = np.cumsum(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    start = np.arange(n)
+    sums = prefix[start + w - 1]
+    partial = start % w != 0
+    sums[partial] += suffix[start[partial]]
+    return sums
+
+
+def _full_windows(a, window):
+    return np.lib.stride_tricks.sliding_window_view(a, window)
+
+
+def rolling_mean(values, window):
+    a = _as_array(values)
+    if window <= 0 or not a.size:
+        return []
+    return (_windowed_sum(a, window) / _counts(a.size, window)).tolist()
+
+
+def rolling_std(values, window):
+    a = _as_array(values)
+    if window <= 0 or not a.size:
+        return []
+    # Shift by the global mean so the sum of squares stays well conditioned
+    shifted = a - a.mean()
+    counts = _counts(a.size, window)
+    m = _windowed_sum(shifted, window) / counts
+    m2 = _windowed_sum(shifted * shifted, window) / counts
+    var = m2 - m * m
+    # Cancellation noise around zero variance would otherwise survive sqrt
+    var[var <= 1e-12 * m2] = 0.0
+    return np.sqrt(var).tolist()
+
+
+def _rolling_reduce(a, window, reduce_full, accumulate):
+    n = a.size
+    head = min(window - 1, n)
+    out = np.empty(n)
+    out[:head] = accumulate(a[:head])
+    if n >= window:
+        windows = _full_windows(a, window)
+        # Reductions like median copy their input; bound that copy
+        step = max(1, _CHUNK_ELEMENTS // window)
+        for i in range(0, len(windows), step):
+            out[head + i:head + i + step] = reduce_full(windows[i:i + step])
+    return out.tolist()
+
+
+def rolling_min(values, window):
+    a = _as_array(values)
+    if window <= 0 or not a.size:
+        return []
+    return _rolling_reduce(
+        a, window, lambda w: w.min(axis=1), np.minimum.accumulate
+    )
+
+
+def rolling_max(values, window):
+    a = _as_array(values)
+    if window <= 0 or not a.size:
+        return []
+    return _rolling_reduce(
+        a, window, lambda w: w.max(axis=1), np.maximum.accumulate
+    )
+
+
+def _sorted_window_median(a, window):
+    values = a.tolist()
+    ordered = []
+    out = []
+    for i, v in enumerate(values):
+        insort(ordered, v)
+        if i >= window:
+            del ordered[bisect_left(ordered, values[i - window])]
+        n = len(ordered)
+        mid = n // 2
+        out.append(ordered[mid] if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2)
+    return out
+
+
+def rolling_median(values, window):
+    a = _as_array(values)
+    if window <= 0 or not a.size:
+        return []
+    if window > _MEDIAN_PARTITION_MAX:
+        return _sorted_window_median(a, window)
+
+    def expanding(head):
+        return [np.median(head[:i + 1]) for i in range(head.size)]
+
+    return _rolling_reduce(
+        a, window, lambda w: np.median(w, axis=1), expanding
+    )
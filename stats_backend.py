@@ -0,0 +1,31 @@
+"""
+stats_backend.py
+Picks the statistics implementation for host-side analysis
+
+Uses statistics_np when NumPy is importable and falls back to the pure
+Python statistics.py (which is also what runs on the ESP32).
+
+    from stats_backend import mean, rolling_mean, BACKEND
+"""
+
+try:
+    import numpy  # noqa: F401
+    import statistics_np as _impl
+    BACKEND = "numpy"
+except ImportError:
+    import statistics as _impl
+    BACKEND = "python"
+
+mean = _impl.mean
+moving_average = _impl.moving_average
+median = _impl.median
+min_max_range = _impl.min_max_range
+variance = _impl.variance
+std_dev = _impl.std_dev
+correlation = _impl.correlation
+
+rolling_mean = _impl.rolling_mean
+rolling_median = _impl.rolling_median
+rolling_std = _impl.rolling_std
+rolling_min = _impl.rolling_min
+rolling_max = _impl.rolling_max
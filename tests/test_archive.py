@@ -0,0 +1,55 @@
+"""
+Archive.rows() must give back exactly what was written.
+"""
+
+import json
+import os
+
+from archive import Archive, ArchiveWriter, convert
+from replay import read_jsonl
+
+CAPTURE = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                       "esp32_weather.jsonl")
+
+
+def _round_trip(tmp_path, records, **kwargs):
+    path = str(tmp_path / "test.wxa")
+    with ArchiveWriter(path, **kwargs) as writer:
+        for record in records:
+            writer.write(record)
+    with Archive(path) as archive:
+        return list(archive.rows())
+
+
+def test_capture_round_trip(tmp_path):
+    path = str(tmp_path / "capture.wxa")
+    convert(CAPTURE, path)
+    originals = list(read_jsonl(CAPTURE))
+    with Archive(path) as archive:
+        rows = list(archive.rows())
+
+    assert len(rows) == len(originals)
+    for row, original in zip(rows, originals):
+        assert json.dumps(row) == json.dumps(original)
+
+
+def test_ints_survive_nulls_and_floats(tmp_path):
+    records = [
+        {"c": 2, "lux": 41},
+        {"c": None, "lux": 41.5},
+        {"c": 7, "lux": None},
+        {"c": 1 << 40, "lux": 0},
+    ]
+    rows = _round_trip(tmp_path, records)
+    assert json.dumps(rows) == json.dumps(records)
+
+
+def test_null_next_to_object(tmp_path):
+    records = [{"api": None}, {"api": {"city": "x"}}, {"api": {}}]
+    assert _round_trip(tmp_path, records) == records
+
+
+def test_missing_keys_stay_missing(tmp_path):
+    records = [{"a": 1}, {"b": 2.5}, {"a": None, "b": None}]
+    rows = _round_trip(tmp_path, records, chunk_rows=2)
+    assert json.dumps(rows) == json.dumps(records)
@@ -0,0 +1,214 @@
+"""
+MQTTSink and Outbox against the local FakeBroker.
+"""
+
+import json
+import time
+
+import pytest
+
+from mqtt_fake import FakeBroker
+from mqtt_sink import MQTTSink, Outbox, PahoClient
+
+STATION = "test-station"
+SAMPLES = "weather/%s/samples" % STATION
+LATEST = "weather/%s/latest" % STATION
+STATUS = "weather/%s/status" % STATION
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+def samples(broker):
+    """
+    Every payload published on the samples topic, batches flattened.
+    """
+    out = []
+    for body in broker.topics(SAMPLES):
+        item = json.loads(body)
+        out.extend(item if isinstance(item, list) else [item])
+    return out
+
+
+@pytest.fixture
+def broker():
+    pytest.importorskip("paho.mqtt.client")
+    broker = FakeBroker().start()
+    yield broker
+    broker.stop()
+
+
+@pytest.fixture
+def outbox_path(tmp_path):
+    return str(tmp_path / "outbox.txt")
+
+
+def make_sink(broker, outbox_path, clock=None, **kwargs):
+    host, port = broker.address
+
+    def factory():
+        return PahoClient(STATION, host, port, timeout=1)
+
+    kwargs.setdefault("batch", 3)
+    return MQTTSink(factory, station=STATION, outbox=Outbox(outbox_path),
+                    clock=clock or Clock(), **kwargs)
+
+
+def go_offline(broker, sink):
+    broker.online = False
+    broker.drop_clients()
+    paho = sink._client._client
+    wait_for(lambda: not paho.is_connected())
+
+
+def test_batches(broker, outbox_path):
+    sink = make_sink(broker, outbox_path)
+    for i in range(7):
+        sink.send({"n": i})
+
+    bodies = [json.loads(b) for b in broker.topics(SAMPLES)]
+    assert bodies == [[{"n": 0}, {"n": 1}, {"n": 2}],
+                      [{"n": 3}, {"n": 4}, {"n": 5}]]
+
+    # A partial batch goes out on flush, as a single object
+    sink.flush()
+    assert json.loads(broker.topics(SAMPLES)[-1]) == {"n": 6}
+    assert sink.published == 7
+    assert sink.queued == 0
+    sink.close()
+
+
+def test_retained_latest_and_status(broker, outbox_path):
+    sink = make_sink(broker, outbox_path)
+    for i in range(4):
+        sink.send({"n": i})
+    assert json.loads(broker.retained[LATEST]) == {"n": 2}
+    assert broker.retained[STATUS] == b"online"
+
+    sink.close()
+    assert json.loads(broker.retained[LATEST]) == {"n": 3}
+    assert broker.retained[STATUS] == b"offline"
+    assert broker.client_ids == [STATION]
+
+
+def test_last_will_on_unclean_drop(broker, outbox_path):
+    sink = make_sink(broker, outbox_path, batch=1)
+    sink.send({"n": 0})
+    assert broker.retained[STATUS] == b"online"
+
+    # No DISCONNECT reaches the broker, so it publishes the will
+    broker.drop_clients()
+    wait_for(lambda: broker.retained[STATUS] == b"offline")
+    will = [m for m in broker.messages if m[0] == STATUS][-1]
+    assert will[1:] == (b"offline", 1, True)
+    sink._close(sink._client)
+
+
+def test_outbox_drains_in_order_after_outage(broker, outbox_path):
+    clock = Clock()
+    sink = make_sink(broker, outbox_path, clock, drain_per_send=2)
+    for i in range(3):
+        sink.send({"n": i})
+
+    go_offline(broker, sink)
+    for i in range(3, 15):
+        sink.send({"n": i})
+    assert not sink.connected
+    assert sink.queued == 12
+    assert len(sink.outbox)
+
+    broker.online = True
+    clock.now += 1000
+    n = 15
+    while len(sink.outbox):
+        sink.send({"n": n})
+        n += 1
+    sink.flush()
+
+    assert [s["n"] for s in samples(broker)] == list(range(n))
+    assert broker.connections == 2
+    sink.close()
+
+
+def test_outbox_drains_in_order_after_restart(broker, outbox_path):
+    broker.online = False
+    sink = make_sink(broker, outbox_path)
+    for i in range(9):
+        sink.send({"n": i})
+    sink.flush()
+    assert sink.queued == 9
+    assert broker.connections == 0
+
+    # Reboot: a new sink picks the backlog up from the file
+    broker.online = True
+    sink = make_sink(broker, outbox_path, drain_per_send=2)
+    sink.send({"n": 9})
+    assert [s["n"] for s in samples(broker)] == [0, 1, 2, 3, 4, 5]
+
+    # Another reboot after one drain pass; {"n": 9} was only in RAM
+    sink._close(sink._client)
+    sink = make_sink(broker, outbox_path, drain_per_send=2)
+    n = 10
+    while len(sink.outbox):
+        sink.send({"n": n})
+        n += 1
+    sink.flush()
+
+    # Each drain pass saved its position, so nothing is sent twice
+    assert [s["n"] for s in samples(broker)] == list(range(9)) + list(range(10, n))
+    sink.close()
+
+
+def test_outbox_saves_position_once_per_pass(outbox_path, monkeypatch):
+    outbox = Outbox(outbox_path)
+    for i in range(5):
+        outbox.append("t", str(i))
+
+    saves = []
+    real_save = Outbox._save_pos
+    monkeypatch.setattr(Outbox, "_save_pos",
+                        lambda self: saves.append(self._pos) or real_save(self))
+    for _ in range(3):
+        outbox.peek()
+        outbox.ack()
+    assert saves == []
+    outbox.save()
+    outbox.save()
+    assert len(saves) == 1
+
+    assert Outbox(outbox_path).peek() == ("t", "3")
+
+
+def test_outbox_compaction_drops_oldest_half(outbox_path):
+    line = len("t\t0\n")
+    outbox = Outbox(outbox_path, max_bytes=line * 8)
+    for i in range(8):
+        outbox.append("t", str(i))
+    outbox.peek()
+    outbox.ack()
+    outbox.save()
+
+    # Seven pending: the three oldest go, the rest are copied to offset 0
+    outbox.append("t", "8")
+    assert outbox.dropped == 3
+    bodies = []
+    while True:
+        message = outbox.peek()
+        if message is None:
+            break
+        bodies.append(message[1])
+        outbox.ack()
+    assert bodies == ["4", "5", "6", "7", "8"]
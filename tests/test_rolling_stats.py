@@ -0,0 +1,42 @@
+"""
+RollingStats must not drift on a device that runs indefinitely.
+"""
+
+import random
+
+import statistics as py
+
+
+def _exact(values):
+    return py.mean(values), py.variance(values)
+
+
+def test_no_drift_after_large_values_leave():
+    stats = py.RollingStats(60)
+    rng = random.Random(3)
+    for _ in range(300007):
+        stats.push(1e6 + rng.random() * 1000)
+    for _ in range(60):
+        stats.push(1.0)
+
+    assert stats.mean() == 1.0
+    assert stats.variance() == 0.0
+    assert stats.moving_average() == 1.0
+
+
+def test_long_run_matches_exact_window():
+    stats = py.RollingStats(50, window=10)
+    rng = random.Random(5)
+    recent = []
+    for i in range(200003):
+        # Slow drift plus rare spikes, like an LDR over days
+        x = 500 + 400 * ((i // 5000) % 2) + rng.gauss(0, 3)
+        if rng.random() < 0.001:
+            x *= 1000
+        stats.push(x)
+        recent = (recent + [x])[-50:]
+
+    mean, var = _exact(recent)
+    assert abs(stats.mean() - mean) <= 1e-9 * abs(mean)
+    assert abs(stats.variance() - var) <= 1e-9 * max(var, 1.0)
+    assert abs(stats.moving_average() - py.mean(recent[-10:])) <= 1e-9 * mean
@@ -0,0 +1,152 @@
+"""
+statistics_np must agree with statistics.py on every input the device
+code and the host tools pass in.
+"""
+
+import math
+import random
+from array import array
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import statistics as py  # noqa: E402
+import statistics_np as vec  # noqa: E402
+from ring_buffer import RingBuffer  # noqa: E402
+
+SCALARS = ["mean", "median", "variance", "std_dev"]
+ROLLING = ["rolling_mean", "rolling_median", "rolling_std",
+           "rolling_min", "rolling_max"]
+WINDOWS = [1, 2, 3, 10, 64, 200, 500]
+
+
+def _series(n=300, seed=7):
+    rng = random.Random(seed)
+    level = 20.0
+    out = []
+    for _ in range(n):
+        level += rng.gauss(0, 0.5)
+        # Repeated values and spikes, like real lux readings
+        out.append(round(level, 1) if rng.random() < 0.9 else level * 3)
+    return out
+
+
+def _ring(values, capacity=None):
+    ring = RingBuffer(capacity or len(values), "d")
+    for v in values:
+        ring.append(v)
+    return ring.view()
+
+
+def _close(a, b, tol=1e-9):
+    if a is None or b is None:
+        return a is None and b is None
+    if isinstance(a, tuple):
+        return len(a) == len(b) and all(_close(x, y, tol) for x, y in zip(a, b))
+    return math.isclose(a, b, rel_tol=tol, abs_tol=tol)
+
+
+def _assert_series(a, b, tol=1e-9):
+    assert len(a) == len(b)
+    for i, (x, y) in enumerate(zip(a, b)):
+        assert _close(x, y, tol), "index %d: %r != %r" % (i, x, y)
+
+
+VALUES = _series()
+INPUTS = {
+    "list": lambda v: list(v),
+    "array": lambda v: array("d", v),
+    "memoryview": lambda v: memoryview(array("d", v)),
+    # Wrapped ring buffer: the view starts mid-storage
+    "ringview": lambda v: _ring(v[:40] + v, len(v)),
+}
+
+
+@pytest.fixture(params=sorted(INPUTS))
+def values(request):
+    return INPUTS[request.param](VALUES)
+
+
+@pytest.mark.parametrize("name", SCALARS)
+def test_scalars_match(name, values):
+    assert _close(getattr(vec, name)(values), getattr(py, name)(VALUES))
+
+
+def test_min_max_range_matches(values):
+    assert _close(vec.min_max_range(values), py.min_max_range(VALUES))
+
+
+@pytest.mark.parametrize("window", [1, 5, 300, 1000])
+def test_moving_average_matches(window, values):
+    assert _close(vec.moving_average(values, window),
+                  py.moving_average(VALUES, window))
+
+
+def test_correlation_matches(values):
+    other = [v * 0.3 + i % 7 for i, v in enumerate(VALUES)]
+    assert _close(vec.correlation(values, other), py.correlation(VALUES, other))
+    # Uneven lengths use the newest common samples
+    assert _close(vec.correlation(values, other[:100]),
+                  py.correlation(VALUES, other[:100]))
+
+
+def test_correlation_constant_series():
+    assert vec.correlation([1.0] * 5, [1, 2, 3, 4, 5]) is None
+    assert py.correlation([1.0] * 5, [1, 2, 3, 4, 5]) is None
+
+
+@pytest.mark.parametrize("window", WINDOWS)
+@pytest.mark.parametrize("name", ROLLING)
+def test_rolling_matches(name, window, values):
+    # Both rolling_std versions cancel running sums; the error is small
+    # in the variance but sqrt magnifies it near zero (equal neighbours)
+    tol = 1e-5 if name == "rolling_std" else 1e-9
+    _assert_series(getattr(vec, name)(values, window),
+                   getattr(py, name)(VALUES, window), tol)
+
+
+@pytest.mark.parametrize("name", ROLLING)
+def test_rolling_constant_series(name):
+    flat = [3.5] * 50
+    _assert_series(getattr(vec, name)(flat, 7), getattr(py, name)(flat, 7))
+
+
+@pytest.mark.parametrize("empty", [[], array("d"), memoryview(array("d"))],
+                         ids=["list", "array", "memoryview"])
+def test_empty_input(empty):
+    for module in (py, vec):
+        for name in SCALARS:
+            assert getattr(module, name)(empty) is None
+        assert module.min_max_range(empty) == (None, None, None)
+        assert module.moving_average(empty, 5) is None
+        assert module.correlation(empty, empty) is None
+        for name in ROLLING:
+            assert getattr(module, name)(empty, 5) == []
+
+
+def test_empty_ringview():
+    view = RingBuffer(4, "d").view()
+    assert vec.mean(view) is None
+    assert py.mean(view) is None
+    assert vec.rolling_mean(view, 3) == py.rolling_mean(view, 3) == []
+
+
+def test_single_value():
+    assert vec.correlation([1.0], [2.0]) is None
+    assert py.correlation([1.0], [2.0]) is None
+    for name in SCALARS:
+        assert _close(getattr(vec, name)([4.0]), getattr(py, name)([4.0]))
+
+
+@pytest.mark.parametrize("window", [0, -3])
+def test_non_positive_window(window):
+    for module in (py, vec):
+        assert module.moving_average(VALUES, window) is None
+        for name in ROLLING:
+            assert getattr(module, name)(VALUES, window) == []
+
+
+def test_results_are_python_floats(values):
+    assert type(vec.mean(values)) is float
+    assert all(type(v) is float for v in vec.rolling_median(values, 5))
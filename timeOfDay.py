@@ -14,13 +14,13 @@ Sensors ─┐
 API ─────┘              └──► append → SD (/sd/*.jsonl)
 
 '''
-from machine import Pin, I2C, ADC, SPI #type:ignore
+from machine import Pin, I2C, ADC #type:ignore
 from time import sleep, time
 import json
 import network #type: ignore
-import urequests
-import os
-import sdcard #type:ignore
+from weather_api import WeatherClient
+from sdcard_fs import SDSession
+from ring_buffer import RingBuffer
 
 
 # Configuration
@@ -42,23 +42,6 @@ TREND_EPSILON = 5
 last_time_state = "Unknown"
 
 
-class Time:
-    """Local time derived from a Unix timestamp and timezone offset."""
-
-    def __init__(self, timestamp: int, timezone_offset: int):
-        local_seconds = timestamp + timezone_offset
-        seconds_in_day = local_seconds % 86400
-        self.hour = seconds_in_day // 3600
-        self.minute = (seconds_in_day % 3600) // 60
-
-    def __str__(self) -> str:
-        return f"{self._pad(self.hour)}:{self._pad(self.minute)}"
-
-    @staticmethod
-    def _pad(value: int) -> str:
-        return f"0{value}" if value < 10 else str(value)
-
-
 class AHT30:
     """I2C driver for the AHT30 temperature and humidity sensor."""
 
@@ -116,26 +99,7 @@ def connect_to_internet(timeout=15) -> bool:
 
 
 
-def get_weather(city: str) -> dict:
-    """Fetch current weather data for a city from OpenWeatherMap."""
-    url = (
-        "http://api.openweathermap.org/data/2.5/weather"
-        f"?appid={API_KEY}&q={city}"
-    )
-    r = urequests.get(url)
-    data = r.json()
-    r.close()
-    return data
-
-
-def convert_temp(kelvin: float) -> tuple:
-    """Convert Kelvin to (Celsius, Fahrenheit)."""
-    c = kelvin - 273.15
-    f = c * 9 / 5 + 32
-    return round(c, 1), round(f, 1)
-
-
-def time_of_day_from_trend(lux_history: list) -> str:
+def time_of_day_from_trend(lux_history) -> str:
     """Infer time-of-day from light intensity trends."""
     if len(lux_history) < 10:
         return "Unknown"
@@ -167,55 +131,8 @@ def stable_time_state(new_state: str) -> str:
         last_time_state = new_state
     return last_time_state
 
-def mount_sd_card() -> bool:
-    global SD_AVAILABLE
-    try:
-        spi = SPI(
-            2,
-            baudrate=10_000_000,
-            polarity=0,
-            phase=0,
-            sck=Pin(18),
-            mosi=Pin(23),
-            miso=Pin(19)
-        )
-        cs = Pin(5, Pin.OUT)
-
-        sd = sdcard.SDCard(spi, cs)
-        os.mount(sd, SD_MOUNT_POINT)
-
-        print("SD card mounted at", SD_MOUNT_POINT)
-        SD_AVAILABLE = True
-        return True
-
-    except Exception as e:
-        print("SD card mount failed:", e)
-        SD_AVAILABLE = False
-        return False
-    
-def get_log_filename() -> str:
-    date = time.strftime("%Y-%m-%d", time.localtime())
-    return f"{SD_MOUNT_POINT}/weather_{date}.jsonl"
-
-
-def log_to_sd(payload: dict):
-    #Error checking if SD card mounting fails
-    if not mount_sd_card():
-        raise RuntimeError("SD card required")
-
-    #Error checking if SD card writing/opening a JSON file fails
-    try:
-        with open(get_log_filename(), "a") as f:
-            f.write(json.dumps(payload) + "\n")
-    except Exception as e:
-        print("SD write error:", e)
-
-
-
-#SD card setup
-
-SD_MOUNT_POINT = "/sd"
-SD_AVAILABLE = False
+# SD card setup (mounted once, remounted only after an I/O error)
+sd_session = SDSession()
 
 # Hardware setup
 i2c = I2C(0, scl=Pin(22), sda=Pin(21), freq=100000)
@@ -225,12 +142,10 @@ ldr = ADC(Pin(32))
 ldr.atten(ADC.ATTN_11DB)
 ldr.width(ADC.WIDTH_12BIT)
 
-cached_api = None
-last_api_time = 0
-lux_history = []
+weather = WeatherClient(API_KEY, CITY, ttl=API_INTERVAL)
+lux_history = RingBuffer(LUX_HISTORY_SIZE)
 
 connect_to_internet()
-mount_sd_card()
 
 
 while True:
@@ -244,8 +159,6 @@ while True:
     light_lux = round((ldr.read() / 4095) * 1000, 1)
 
     lux_history.append(light_lux)
-    if len(lux_history) > LUX_HISTORY_SIZE:
-        lux_history.pop(0)
 
     time_state = stable_time_state(
         time_of_day_from_trend(lux_history)
@@ -258,36 +171,13 @@ while True:
         "time_of_day": time_state
     }
 
-    if cached_api is None or (now - last_api_time) >= API_INTERVAL:
-        try:
-            api_raw = get_weather(CITY)
-
-            temp_c, temp_f = convert_temp(api_raw["main"]["temp"])
-            sunrise = Time(api_raw["sys"]["sunrise"], api_raw["timezone"])
-            sunset = Time(api_raw["sys"]["sunset"], api_raw["timezone"])
-
-            cached_api = {
-                "city": CITY,
-                "temperature_c": temp_c,
-                "temperature_f": temp_f,
-                "humidity_percent": api_raw["main"]["humidity"],
-                "sunrise": str(sunrise),
-                "sunset": str(sunset),
-                "description": api_raw["weather"][0]["description"]
-            }
-
-            last_api_time = now
-
-        except Exception:
-            pass
-
     payload = {
         "timestamp": now,
         "local": local_data,
-        "api": cached_api
+        "api": weather.get()
     }
 
     print(json.dumps(payload))
-    log_to_sd(payload)  
+    sd_session.append(payload)
 
     sleep(1.2)
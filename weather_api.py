@@ -1,11 +1,133 @@
+import time
 import urequests
+from config import API_INTERVAL
+from conversions import convert_temp
+from time_utils import Time
+
+API_URL = "http://api.openweathermap.org/data/2.5/weather"
 
 def get_weather(api_key, city):
     url = (
-        "http://api.openweathermap.org/data/2.5/weather"
+        API_URL +
         f"?appid={api_key}&q={city}"
     )
     r = urequests.get(url)
     data = r.json()
     r.close()
     return data
+
+
+def parse_weather(raw, city):
+    """
+    Convert a raw OpenWeatherMap response into the payload `api` block.
+    """
+    temp_c, temp_f = convert_temp(raw["main"]["temp"])
+    sunrise = Time(raw["sys"]["sunrise"], raw["timezone"])
+    sunset = Time(raw["sys"]["sunset"], raw["timezone"])
+    return {
+        "city": city,
+        "temperature_c": temp_c,
+        "temperature_f": temp_f,
+        "humidity_percent": raw["main"]["humidity"],
+        "sunrise": str(sunrise),
+        "sunset": str(sunset),
+        "description": raw["weather"][0]["description"]
+    }
+
+
+def api_stub(city):
+    return {
+        "city": city,
+        "temperature_c": None,
+        "temperature_f": None,
+        "humidity_percent": None,
+        "sunrise": None,
+        "sunset": None,
+        "description": "offline_stub"
+    }
+
+
+class WeatherClient:
+    """
+    Cached OpenWeatherMap client.
+
+    get() only hits the network once the cached result is older than
+    `ttl`. Failed requests back off exponentially, and while the API is
+    down the last good result is served with its age and a stale flag.
+    `base_url` and `http_get` can point the client at a local fake
+    server.
+    """
+
+    def __init__(self, api_key, city, ttl=API_INTERVAL,
+                 min_backoff=5, max_backoff=600, timeout=5,
+                 base_url=API_URL, http_get=None, clock=time.time):
+        self.api_key = api_key
+        self.city = city
+        self.ttl = ttl
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.base_url = base_url
+        self.http_get = http_get
+        self.clock = clock
+
+        self.failures = 0
+        self.last_error = None
+
+        self._data = None
+        self._fetched_at = 0
+        self._next_attempt = 0
+
+    def url(self):
+        return f"{self.base_url}?appid={self.api_key}&q={self.city}"
+
+    def _fetch(self):
+        http_get = self.http_get or urequests.get
+        r = http_get(self.url(), timeout=self.timeout)
+        try:
+            return r.json()
+        finally:
+            r.close()
+
+    def refresh(self, now=None):
+        """
+        Fetch now, ignoring the TTL. Returns True on success.
+        """
+        if now is None:
+            now = self.clock()
+        try:
+            data = parse_weather(self._fetch(), self.city)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = e
+            delay = self.min_backoff * (2 ** (self.failures - 1))
+            self._next_attempt = now + min(delay, self.max_backoff)
+            return False
+
+        self._data = data
+        self._fetched_at = now
+        self.failures = 0
+        self.last_error = None
+        self._next_attempt = 0
+        return True
+
+    def get(self):
+        """
+        Return the `api` block, refreshing it if it has expired.
+        """
+        now = self.clock()
+        expired = self._data is None or now - self._fetched_at >= self.ttl
+        if expired and now >= self._next_attempt:
+            self.refresh(now)
+
+        if self._data is None:
+            result = api_stub(self.city)
+            result["age_s"] = None
+            result["stale"] = True
+            return result
+
+        age = now - self._fetched_at
+        result = dict(self._data)
+        result["age_s"] = age
+        result["stale"] = age >= self.ttl
+        return result
@@ -0,0 +1,78 @@
+"""
+weather_fake.py
+Local stand-in for the OpenWeatherMap endpoint (host only).
+
+    server = FakeWeatherServer()
+    server.start()
+    client = WeatherClient("key", "Nairobi", base_url=server.url)
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+SAMPLE_RESPONSE = {
+    "main": {"temp": 295.15, "humidity": 60},
+    "sys": {"sunrise": 1705808400, "sunset": 1705852200},
+    "timezone": 10800,
+    "weather": [{"description": "scattered clouds"}]
+}
+
+
+class FakeWeatherServer:
+    """
+    Serves `response` as JSON on 127.0.0.1. Set `fail = True` to answer
+    with HTTP 500, and `delay` to add latency. `requests` counts hits.
+    """
+
+    def __init__(self, response=None, port=0):
+        self.response = response or SAMPLE_RESPONSE
+        self.fail = False
+        self.delay = 0
+        self.requests = 0
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                if fake.delay:
+                    threading.Event().wait(fake.delay)
+                if fake.fail:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                body = json.dumps(fake.response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = HTTPServer(("127.0.0.1", port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/data/2.5/weather"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,8 +1,7 @@
 import network #type:ignore
 from time import sleep, time
 
-SSID = "Ben"
-PASSWORD = "benmwangi1"
+from config import SSID, PASSWORD
 
 def connect_to_internet(timeout=15) -> bool:
     """Connect to WiFi and block until connected."""
@@ -27,6 +26,8 @@ def connect_to_internet(timeout=15) -> bool:
             print("WiFi connection timed out")
             return False
         sleep(0.5)
+    return True
 
 
-connect_to_internet()
\ No newline at end of file
+if __name__ == "__main__":
+    connect_to_internet()
@@ -0,0 +1,388 @@
+"""
+wire.py
+Compact binary framing for the serial stream
+
+Every frame is
+
+    magic (A5 5A) | version u8 | type u8 | length u16 | body | crc16
+
+little-endian, with a CRC-16/CCITT over version..body so the host can
+resync after noise, banners or a reset mid-frame.
+
+- SAMPLE frames carry a sequence number, the timestamp, the time of
+  day label and every numeric field as float32 (NaN for None).
+- SCHEMA frames map those floats back to stats keys and labels to
+  strings. They are sent when the layout changes and every
+  `resend_every` samples so a late listener can lock on.
+- STATIC frames carry the `api` block as JSON, which only changes when
+  the weather is refreshed.
+
+FrameEncoder runs on the device and reuses one buffer, so a sample costs
+a few pack_into calls instead of a json.dumps. FrameDecoder on the host
+rebuilds the JSON payload Node-RED expects:
+
+    python wire.py encode esp32_weather.jsonl capture.bin
+    python wire.py decode capture.bin > decoded.jsonl
+"""
+
+import json
+import struct
+
+MAGIC = b"\xa5\x5a"
+VERSION = 1
+
+FRAME_SAMPLE = 1
+FRAME_SCHEMA = 2
+FRAME_STATIC = 3
+
+HEAD = "<2sBBH"
+HEAD_SIZE = 6
+CRC_SIZE = 2
+MAX_BODY = 4096
+
+# schema id, static id, label index, seq, seconds, milliseconds
+SAMPLE_HEAD = "<BBBIIH"
+SAMPLE_HEAD_SIZE = 13
+
+LOCAL_FIELDS = ("temperature_c", "humidity_percent", "light_lux")
+NAN = float("nan")
+
+
+def crc16(data, crc=0xFFFF):
+    """
+    CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF).
+    """
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+def _stats_layout(stats):
+    """
+    Flatten the stats block into (key, subkey) pairs; subkey is None
+    for plain values and set for nested dicts such as `corr`.
+    """
+    layout = []
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            for sub in value:
+                layout.append((key, sub))
+        else:
+            layout.append((key, None))
+    return tuple(layout)
+
+
+def _layout_matches(layout, stats):
+    count = 0
+    for key, value in stats.items():
+        count += len(value) if isinstance(value, dict) else 1
+    if count != len(layout):
+        return False
+    for key, sub in layout:
+        value = stats.get(key)
+        if sub is None:
+            if isinstance(value, dict) or key not in stats:
+                return False
+        elif not isinstance(value, dict) or sub not in value:
+            return False
+    return True
+
+
+class FrameEncoder:
+    """
+    Turn payload dicts into frames. encode() returns a memoryview into
+    an internal buffer that is only valid until the next call.
+    """
+
+    def __init__(self, resend_every=300):
+        self.resend_every = resend_every
+        self.seq = 0
+
+        self._buf = bytearray(256)
+        self._layout = None
+        self._labels = []
+        self._mode = None
+        self._schema_id = 0
+        self._api = None
+        self._static_id = 0
+        self._since_resend = 0
+
+    def _reserve(self, size):
+        if len(self._buf) < size:
+            # A fresh buffer, since the caller may still hold a view
+            buf = bytearray(size * 2)
+            buf[:len(self._buf)] = self._buf
+            self._buf = buf
+
+    def _finish(self, off, frame_type, body_len):
+        buf = self._buf
+        struct.pack_into(HEAD, buf, off, MAGIC, VERSION, frame_type, body_len)
+        end = off + HEAD_SIZE + body_len
+        crc = crc16(memoryview(buf)[off + 2:end])
+        struct.pack_into("<H", buf, end, crc)
+        return end + CRC_SIZE
+
+    def _json_frame(self, off, frame_type, ident, obj):
+        body = json.dumps(obj).encode()
+        self._reserve(off + HEAD_SIZE + 1 + len(body) + CRC_SIZE)
+        self._buf[off + HEAD_SIZE] = ident
+        start = off + HEAD_SIZE + 1
+        self._buf[start:start + len(body)] = body
+        return self._finish(off, frame_type, 1 + len(body))
+
+    def encode(self, payload):
+        local = payload.get("local") or {}
+        stats = payload.get("stats") or {}
+        api = payload.get("api")
+        label = local.get("time_of_day")
+        mode = payload.get("mode")
+
+        off = 0
+        resend = self._since_resend >= self.resend_every
+        if (self._layout is None or mode != self._mode
+                or label not in self._labels
+                or not _layout_matches(self._layout, stats)):
+            if label not in self._labels:
+                self._labels.append(label)
+            self._layout = _stats_layout(stats)
+            self._mode = mode
+            self._schema_id = (self._schema_id + 1) & 0xFF
+            resend = True
+        if resend:
+            off = self._json_frame(off, FRAME_SCHEMA, self._schema_id, {
+                "mode": mode,
+                "labels": self._labels,
+                "stats": self._layout
+            })
+
+        if api is not self._api and api != self._api:
+            self._api = api
+            self._static_id = (self._static_id + 1) & 0xFF
+            resend = True
+        if resend:
+            off = self._json_frame(off, FRAME_STATIC, self._static_id, api)
+            self._since_resend = 0
+        self._since_resend += 1
+
+        count = len(LOCAL_FIELDS) + len(self._layout)
+        body_len = SAMPLE_HEAD_SIZE + 4 * count
+        self._reserve(off + HEAD_SIZE + body_len + CRC_SIZE)
+
+        ts = payload.get("timestamp") or 0
+        seconds = int(ts)
+        pos = off + HEAD_SIZE
+        struct.pack_into(SAMPLE_HEAD, self._buf, pos,
+                         self._schema_id, self._static_id,
+                         self._labels.index(label), self.seq & 0xFFFFFFFF,
+                         seconds, int((ts - seconds) * 1000))
+        pos += SAMPLE_HEAD_SIZE
+        for name in LOCAL_FIELDS:
+            value = local.get(name)
+            struct.pack_into("<f", self._buf, pos, NAN if value is None else value)
+            pos += 4
+        for key, sub in self._layout:
+            value = stats[key] if sub is None else stats[key][sub]
+            struct.pack_into("<f", self._buf, pos, NAN if value is None else value)
+            pos += 4
+
+        end = self._finish(off, FRAME_SAMPLE, body_len)
+        self.seq += 1
+        return memoryview(self._buf)[:end]
+
+
+def _f32(value):
+    # float32 -> shortest decimal that round-trips, NaN -> None
+    if value != value:
+        return None
+    return float("%.7g" % value)
+
+
+class FrameDecoder:
+    """
+    Incremental decoder: feed() any chunk of the byte stream and get
+    back the (seq, payload) pairs it completed. Bytes outside frames
+    (boot banners, prints) are skipped and counted.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._schemas = {}
+        self._statics = {}
+        self.last_seq = None
+
+        self.frames = 0
+        self.skipped_bytes = 0
+        self.crc_errors = 0
+        self.orphans = 0
+        self.missed = 0
+        self.resets = 0
+
+    def feed(self, data):
+        self._buf.extend(data)
+        out = []
+        buf = self._buf
+        pos = 0
+        while True:
+            start = buf.find(MAGIC, pos)
+            if start < 0:
+                # Keep a trailing A5 that may be half of the next magic
+                keep = len(buf) - 1 if buf[-1:] == MAGIC[:1] else len(buf)
+                self.skipped_bytes += keep - pos
+                pos = keep
+                break
+            self.skipped_bytes += start - pos
+            pos = start
+            if len(buf) - pos < HEAD_SIZE:
+                break
+
+            _, version, frame_type, length = struct.unpack_from(HEAD, buf, pos)
+            if version != VERSION or length > MAX_BODY:
+                self.skipped_bytes += 1
+                pos += 1
+                continue
+            end = pos + HEAD_SIZE + length
+            if len(buf) < end + CRC_SIZE:
+                break
+
+            (crc,) = struct.unpack_from("<H", buf, end)
+            if crc != crc16(memoryview(buf)[pos + 2:end]):
+                self.crc_errors += 1
+                self.skipped_bytes += 1
+                pos += 1
+                continue
+
+            self.frames += 1
+            body = bytes(buf[pos + HEAD_SIZE:end])
+            pos = end + CRC_SIZE
+            result = self._handle(frame_type, body)
+            if result is not None:
+                out.append(result)
+
+        del buf[:pos]
+        return out
+
+    def _handle(self, frame_type, body):
+        if frame_type == FRAME_SCHEMA:
+            schema = json.loads(body[1:])
+            schema["stats"] = [tuple(item) for item in schema["stats"]]
+            self._schemas[body[0]] = schema
+        elif frame_type == FRAME_STATIC:
+            self._statics[body[0]] = json.loads(body[1:])
+        elif frame_type == FRAME_SAMPLE:
+            return self._sample(body)
+        return None
+
+    def _sample(self, body):
+        schema_id, static_id, label, seq, seconds, ms = struct.unpack_from(
+            SAMPLE_HEAD, body
+        )
+        schema = self._schemas.get(schema_id)
+        if schema is None or static_id not in self._statics:
+            self.orphans += 1
+            return None
+
+        if self.last_seq is not None:
+            if seq > self.last_seq:
+                self.missed += seq - self.last_seq - 1
+            else:
+                self.resets += 1
+        self.last_seq = seq
+
+        count = (len(body) - SAMPLE_HEAD_SIZE) // 4
+        values = struct.unpack_from("<%df" % count, body, SAMPLE_HEAD_SIZE)
+
+        local = {}
+        for i, name in enumerate(LOCAL_FIELDS):
+            local[name] = _f32(values[i])
+        labels = schema["labels"]
+        local["time_of_day"] = labels[label] if label < len(labels) else None
+
+        stats = {}
+        for i, (key, sub) in enumerate(schema["stats"]):
+            value = _f32(values[len(LOCAL_FIELDS) + i])
+            if sub is None:
+                stats[key] = value
+            else:
+                stats.setdefault(key, {})[sub] = value
+
+        api = self._statics[static_id]
+        return seq, {
+            "timestamp": seconds if not ms else seconds + ms / 1000,
+            "mode": schema["mode"],
+            "local": local,
+            "api": dict(api) if isinstance(api, dict) else api,
+            "stats": stats
+        }
+
+
+def main(argv=None):
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("encode", help="encode a JSONL capture into frames")
+    p.add_argument("capture")
+    p.add_argument("out")
+
+    p = sub.add_parser("decode", help="decode frames back into JSONL")
+    p.add_argument("stream", help="binary capture, or - for stdin")
+    p.add_argument("--out", help="write JSONL here instead of stdout")
+    p.add_argument("--seq", action="store_true",
+                   help="include the frame sequence number as _seq")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "encode":
+        from replay import read_jsonl
+
+        encoder = FrameEncoder()
+        json_bytes = 0
+        frame_bytes = 0
+        samples = 0
+        with open(args.out, "wb") as out:
+            for record in read_jsonl(args.capture):
+                json_bytes += len(json.dumps(record)) + 1
+                frames = encoder.encode(record)
+                frame_bytes += len(frames)
+                samples += 1
+                out.write(frames)
+        print("%d samples: %d bytes JSON -> %d bytes framed (%.1fx)"
+              % (samples, json_bytes, frame_bytes,
+                 json_bytes / frame_bytes if frame_bytes else 0),
+              file=sys.stderr)
+        return 0
+
+    decoder = FrameDecoder()
+    src = sys.stdin.buffer if args.stream == "-" else open(args.stream, "rb")
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        while True:
+            chunk = src.read(65536)
+            if not chunk:
+                break
+            for seq, payload in decoder.feed(chunk):
+                if args.seq:
+                    payload["_seq"] = seq
+                out.write(json.dumps(payload) + "\n")
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+
+    print("%d frames, %d bytes skipped, %d crc errors, %d missed, %d resets"
+          % (decoder.frames, decoder.skipped_bytes, decoder.crc_errors,
+             decoder.missed, decoder.resets), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())